@@ -10,6 +10,7 @@
 #   - Paths are assumed beeing relative Accsyn default root share, as configured
 #     in Accsyn.
 #   - Submits a transfer job and monitors it, through a job in ftrack. 
+#   - Sends to one or more destinations at once, harvesting only once.
 #   - In ftrack, removes the components from the destination location if they 
 #     were present there.
 #   - When job is done, adds them to the destination location in ftrack.
@@ -27,21 +28,2977 @@
 # Author: Henrik Norin, Accsyn/HDR AB, (c)2020
 # 
 
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
 import json
 import logging
+import logging.handlers
+import os
+import re
 import threading
 import traceback
 import time
 
 import ftrack_api
+import ftrack_api.accessor.disk
 
 import accsyn_api
 
 identifier = 'ftrackaccsyn_v1.action'
 
-class AccsynSendAction():
+
+def chunks(items, size):
+    '''Yield successive chunks of *size* items from *items*.'''
+    for idx in range(0, len(items), size):
+        yield items[idx:idx + size]
+
+
+def unique(items):
+    '''Return list of unique *items*, preserving order.'''
+    result = []
+    seen = set()
+    for item in items:
+        if not item in seen:
+            seen.add(item)
+            result.append(item)
+    return result
+
+
+def format_ids(ids):
+    '''Return *ids* formatted for use in an ftrack query "in (...)" clause.'''
+    return ', '.join('"{}"'.format(_id) for _id in ids)
+
+
+def format_size(size):
+    '''Return *size* in bytes in human readable form.'''
+    size = float(size)
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size < 1024 or unit == 'TB':
+            break
+        size /= 1024
+    return '{:.1f} {}'.format(size, unit)
+
+
+def write_atomic(path, content):
+    '''Write string *content* to file at *path*, creating its directory if 
+    missing. Written to a temporary file of each process and thread first, 
+    then replacing *path*, so readers and concurrent writers never see a 
+    partial file.'''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = '{}.{}-{}.tmp'.format(path, os.getpid(), 
+        threading.current_thread().ident)
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def parse_location_names(value):
+    '''Return unique location names selected in launch form, *value* being 
+    a list (multi select) or a comma separated string.'''
+    if not isinstance(value, (list, tuple)):
+        value = (value or '').split(',')
+    return unique(name.strip() for name in value if name and name.strip())
+
+
+def format_party(location_name):
+    '''Return Accsyn party for location named *location_name*, the site of
+    same name unless already given as a party (user@domain).'''
+    if location_name.find('@') == -1:
+        return 'site={}'.format(location_name)
+    return location_name
+
+
+class ComponentHarvester(object):
+    '''Resolve components beneath selected entities using chunked queries.
+
+    Selected contexts are first expanded into all their descendant contexts,
+    level by level, with one "parent_id in (...)" query per level and chunk.
+    Components are then resolved for all contexts and versions in as few 
+    "in (...)" queries as possible, query count growing with the depth of 
+    the hierarchy rather than its width. Components are deduplicated by id
+    across items and selected entities.
+
+    With a *page_size*, each query is fetched in pages of that many 
+    components ("offset ... limit ..."), iter_pages() yielding components 
+    one page at a time so they can be processed and released before the 
+    next page is queried.
+    '''
+
+    # Relations a component can have to a selected context.
+    CONTEXT_FILTERS = [
+        'version.asset.context_id in ({0})',
+        'version.task_id in ({0})',
+    ]
+
+    # Relations a component can have to a selected version.
+    VERSION_FILTERS = [
+        'version_id in ({0})',
+    ]
+
+    # Attributes prefetched with each component, everything path evaluation
+    # and project lookup reads, to prevent lazy loading one entity at a time.
+    PROJECTIONS = [
+        'name',
+        'version.asset.parent.project_id',
+        'component_locations.location.name',
+        'component_locations.resource_identifier',
+    ]
+
+    def __init__(self, session, chunk_size=100, projections=None, 
+            page_size=None):
+        self.session = session
+        self.chunk_size = max(1, chunk_size)
+        self.projections = projections or self.PROJECTIONS
+        self.page_size = page_size
+        self.query_count = 0
+        self.levels = 0
+        self.elapsed = 0.0
+        self.project_id = None
+        self.count = 0
+        self._component_ids = set()
+
+    def _query(self, expression):
+        '''Yield pages of components matching *expression* ("Component 
+        where ..."), applying projections, not yet harvested.'''
+        query = 'select {} from {}'.format(', '.join(self.projections), 
+            expression)
+        offset = 0
+        while True:
+            started = time.time()
+            self.query_count += 1
+            if self.page_size:
+                components = self.session.query('{} order by id offset {} '
+                    'limit {}'.format(query, offset, self.page_size)).all()
+            else:
+                components = self.session.query(query).all()
+            self.elapsed += time.time() - started
+            page = self._add(components)
+            if page:
+                yield page
+            if not self.page_size or len(components) < self.page_size:
+                break
+            offset += self.page_size
+
+    def _add(self, components):
+        result = []
+        for component in components:
+            if component['id'] in self._component_ids:
+                continue
+            self._component_ids.add(component['id'])
+            result.append(component)
+        self.count += len(result)
+        return result
+
+    def expand_contexts(self, context_ids):
+        '''Return unique *context_ids* along with ids of all contexts 
+        beneath them, at any depth.'''
+        result = unique(context_ids)
+        seen = set(result)
+        level = result
+        while level:
+            self.levels += 1
+            children = []
+            for ids in chunks(level, self.chunk_size):
+                self.query_count += 1
+                for context in self.session.query(
+                    'select id from TypedContext where parent_id in ({})'
+                    .format(format_ids(ids))
+                ).all():
+                    if not context['id'] in seen:
+                        seen.add(context['id'])
+                        children.append(context['id'])
+            result.extend(children)
+            level = children
+        return result
+
+    def _resolve(self, ids, filters):
+        for ids in chunks(ids, self.chunk_size):
+            for page in self._query(
+                'Component where {}'.format(' or '.join(
+                    f.format(format_ids(ids)) for f in filters))
+            ):
+                yield page
+
+    def iter_pages(self, entities):
+        '''Yield unique components beneath selected *entities*, a page (list)
+        at a time.'''
+        context_ids = []
+        version_ids = []
+        for entity in entities:
+            # Collect all the components attached to the selected entity
+            if entity['entityType'] == 'show':
+                self.project_id = entity['entityId']
+                for page in self._query(
+                    'Component where version.asset.parent.project_id is'
+                    ' "{}"'.format(
+                        entity['entityId']
+                    )
+                ):
+                    yield page
+            elif entity['entityType'] == 'list':
+                list_ = self.session.query(
+                    'List where id is "{0}"'.format(
+                        entity['entityId']
+                    )
+                ).one()
+                self.query_count += 1
+                # Resolve components from all items in list at once
+                if not 'items' in list_:
+                    version_ids.extend(e['version_id'] for e in 
+                        list_['review_session_objects'])
+                    continue
+                for e in list_['items']:
+                    (version_ids if getattr(e, 'entity_type', None) == 
+                        'AssetVersion' else context_ids).append(e['id'])
+            elif entity['entityType'] == 'assetversion':
+                version_ids.append(entity['entityId'])
+            else:
+                # shot/assetbuild or sequence or episode or task, at any 
+                # depth
+                context_ids.append(entity['entityId'])
+
+        started = time.time()
+        context_ids = self.expand_contexts(context_ids)
+        self.elapsed += time.time() - started
+
+        for page in self._resolve(context_ids, self.CONTEXT_FILTERS):
+            yield page
+        for page in self._resolve(unique(version_ids), self.VERSION_FILTERS):
+            yield page
+
+    def harvest(self, entities):
+        '''Return unique components beneath selected *entities*.'''
+        result = []
+        for page in self.iter_pages(entities):
+            result.extend(page)
+        return result
+
+
+class LazyLoadCounter(object):
+    '''Count lazy loads of entity attributes made through sessions it is
+    installed on.
+
+    Unloaded attributes are fetched by ftrack API through session.populate,
+    which is wrapped while installed. Each thread of a send installs it on
+    the session it checked out, so the session is passed explicitly.
+    '''
+
     def __init__(self):
-        self.session = ftrack_api.Session(auto_connect_event_hub=True)
+        self.count = 0
+        self.attributes = collections.Counter()
+        self._lock = threading.Lock()
+
+    def install(self, session):
+        populate = session.populate
+
+        def counting_populate(entities, projections):
+            with self._lock:
+                self.count += 1
+                self.attributes[projections] += 1
+            return populate(entities, projections)
+
+        session.populate = counting_populate
+        return self
+
+    def uninstall(self, session):
+        # Remove instance override, falling back on class method.
+        session.__dict__.pop('populate', None)
+
+    def summary(self, top=5):
+        return '{} lazy load(s){}'.format(self.count, 
+            ' (most frequent: {})'.format(', '.join(
+                '{} x{}'.format(attribute, count) for (attribute, count) in 
+                self.attributes.most_common(top))) if self.count else '')
+
+
+class RunMetrics(object):
+    '''Phase timings and API call counts of a single send.
+
+    Time is attributed to the phase last entered. Sessions are instrumented
+    by overriding their methods on the instance with counting and timing 
+    wrappers while checked out by the send, removed again on release.
+    '''
+
+    FTRACK_METHODS = ['query', 'get', 'commit', 'call']
+    ACCSYN_METHODS = ['create', 'find', 'find_one', 'update']
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.phases = collections.OrderedDict()
+        self.timings = collections.OrderedDict()
+        self.calls = collections.Counter()
+        self.call_seconds = collections.Counter()
+        self._phase = None
+        self._entered = None
+        self._lock = threading.Lock()
+
+    def enter(self, phase):
+        '''End current phase and enter *phase*, None to stop timing.'''
+        now = self.clock()
+        with self._lock:
+            if self._phase is not None:
+                self.phases[self._phase] = self.phases.get(self._phase, 
+                    0.0) + now - self._entered
+            self._phase = phase
+            self._entered = now
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.add_time(name, self.clock() - started)
+
+    def instrument(self, session, api, methods):
+        '''Count and time calls to *methods* of *session*, reported as 
+        *api*.method.'''
+        for name in methods:
+            method = getattr(session, name, None)
+            if method is None or name in session.__dict__:
+                continue
+            session.__dict__[name] = self._wrap('{}.{}'.format(api, name), 
+                method)
+
+    def _wrap(self, key, method):
+        def wrapper(*args, **kwargs):
+            started = self.clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = self.clock() - started
+                with self._lock:
+                    self.calls[key] += 1
+                    self.call_seconds[key] += elapsed
+        return wrapper
+
+    @staticmethod
+    def release(session, methods):
+        # Remove instance overrides, falling back on class methods.
+        for name in methods:
+            session.__dict__.pop(name, None)
+
+    def summary(self):
+        return 'phases: {}; timings: {}; calls: {}'.format(
+            ', '.join('{} {:.2f}s'.format(phase, seconds) for (phase, 
+                seconds) in self.phases.items()) or '-',
+            ', '.join('{} {:.2f}s'.format(name, seconds) for (name, 
+                seconds) in self.timings.items()) or '-',
+            ', '.join('{} x{} ({:.2f}s)'.format(key, count, 
+                self.call_seconds[key]) for (key, count) in 
+                sorted(self.calls.items())) or '-')
+
+
+class MetricsRegistry(object):
+    '''Aggregates of send metrics across runs of the action process, 
+    written to *path* after each run if given; in Prometheus text 
+    exposition format if path ends with ".prom", as JSON otherwise.'''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.runs = collections.Counter()
+        self.phase_seconds = collections.Counter()
+        self.timing_seconds = collections.Counter()
+        self.calls = collections.Counter()
+        self.call_seconds = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add(self, metrics, status):
+        '''Add *metrics* of a run ended with *status*.'''
+        with self._lock:
+            self.runs[status] += 1
+            self.phase_seconds.update(metrics.phases)
+            self.timing_seconds.update(metrics.timings)
+            self.calls.update(metrics.calls)
+            self.call_seconds.update(metrics.call_seconds)
+            if self.path:
+                self.write()
+
+    def as_dict(self):
+        return {
+            'runs': dict(self.runs),
+            'phase_seconds': dict(self.phase_seconds),
+            'timing_seconds': dict(self.timing_seconds),
+            'calls': dict(self.calls),
+            'call_seconds': dict(self.call_seconds),
+        }
+
+    def prometheus(self):
+        '''Return aggregates in Prometheus text exposition format.'''
+        lines = []
+
+        def add(name, help_text, labels, values):
+            lines.append('# HELP accsyn_send_{} {}'.format(name, help_text))
+            lines.append('# TYPE accsyn_send_{} counter'.format(name))
+            for (key, value) in sorted(values.items()):
+                lines.append('accsyn_send_{}{{{}}} {}'.format(name, ','.join(
+                    '{}="{}"'.format(label, part) for (label, part) in 
+                    zip(labels, key.split('.', len(labels) - 1))), value))
+
+        add('runs_total', 'Sends run, by final status.', ['status'], 
+            self.runs)
+        add('phase_seconds_total', 'Time spent in each send phase.', 
+            ['phase'], self.phase_seconds)
+        add('timing_seconds_total', 'Time spent in each send step.', 
+            ['step'], self.timing_seconds)
+        add('calls_total', 'ftrack and Accsyn API calls.', 
+            ['api', 'method'], self.calls)
+        add('call_seconds_total', 'Time spent in ftrack and Accsyn API '
+            'calls.', ['api', 'method'], self.call_seconds)
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        if self.path.endswith('.prom'):
+            write_atomic(self.path, self.prometheus())
+        else:
+            write_atomic(self.path, json.dumps(self.as_dict(), indent=2, 
+                sort_keys=True))
+
+
+class ComponentLocationBookkeeper(object):
+    '''Bulk add/remove of components to/from *location* in ftrack.
+
+    Existing ComponentLocations are fetched in chunked "in (...)" queries,
+    changes are committed in batches of *commit_batch_size*. Should a batch
+    fail, it is retried component by component so one bad component does not
+    fail the whole batch.
+    '''
+
+    def __init__(self, session, location, logger, chunk_size=100, 
+            commit_batch_size=500):
+        self.session = session
+        self.location = location
+        self.logger = logger
+        self.chunk_size = max(1, chunk_size)
+        self.commit_batch_size = max(1, commit_batch_size)
+        self.query_count = 0
+        self.commit_count = 0
+        self.failed = 0
+
+    def fetch_existing(self, component_ids):
+        '''Return dict mapping each of *component_ids* present at location to
+        its ComponentLocation entities.'''
+        result = collections.defaultdict(list)
+        for ids in chunks(list(component_ids), self.chunk_size):
+            self.query_count += 1
+            for cl in self.session.query(
+                'select id, component_id, location_id from ComponentLocation '
+                'where location_id is "{}" and component_id in ({})'.format(
+                    self.location['id'], format_ids(ids))
+            ).all():
+                result[cl['component_id']].append(cl)
+        return result
+
+    def _commit(self):
+        self.commit_count += 1
+        self.session.commit()
+
+    def _apply(self, items, operation):
+        '''Apply *operation* on each of *items*, committing in batches.'''
+        for batch in chunks(items, self.commit_batch_size):
+            try:
+                for item in batch:
+                    operation(item)
+                self._commit()
+                continue
+            except Exception as e:
+                self.session.rollback()
+                self.logger.warning('Commit of {} ComponentLocation change(s) '
+                    'failed, retrying one by one. Details: {}'.format(
+                        len(batch), e))
+            for item in batch:
+                try:
+                    operation(item)
+                    self._commit()
+                except:
+                    self.session.rollback()
+                    self.failed += 1
+                    self.logger.warning(traceback.format_exc())
+
+    def remove(self, component_ids):
+        '''Remove components identified by *component_ids* from location,
+        return number of components removed.'''
+        existing = self.fetch_existing(component_ids)
+
+        def remove_component(component_id):
+            self.logger.info('    Removing component {} from location {}...'
+                .format(component_id, self.location['name']))
+            for cl in existing[component_id]:
+                self.session.delete(cl)
+
+        items = [_id for _id in component_ids if _id in existing]
+        failed = self.failed
+        self._apply(items, remove_component)
+        return len(items) - (self.failed - failed)
+
+    def add(self, components_and_identifiers):
+        '''Add components to location, *components_and_identifiers* being a 
+        list of (component id, resource identifier) tuples. Existing 
+        ComponentLocations are replaced, return number of components added.'''
+        existing = self.fetch_existing(
+            [_id for (_id, resource_identifier) in components_and_identifiers])
+
+        def add_component(item):
+            (component_id, resource_identifier) = item
+            for cl in existing.get(component_id, []):
+                self.session.delete(cl)
+            self.session.create(
+                'ComponentLocation', data=dict(
+                    component_id=component_id,
+                    location_id=self.location['id'],
+                    resource_identifier=resource_identifier
+                )
+            )
+            self.logger.info('    Adding component {} to location {} @ path '
+                '{}.'.format(component_id, self.location['name'], 
+                    resource_identifier))
+
+        failed = self.failed
+        self._apply(components_and_identifiers, add_component)
+        return len(components_and_identifiers) - (self.failed - failed)
+
+    def summary(self):
+        return '{} queries, {} commit(s), {} failed'.format(
+            self.query_count, self.commit_count, self.failed)
+
+
+def parse_etr(etr):
+    '''Return Accsyn estimated time remaining *etr* ("[D:]HH:MM:SS" or 
+    seconds) in seconds, None if unknown.'''
+    if etr is None or etr == '':
+        return None
+    try:
+        if isinstance(etr, (int, float)):
+            return float(etr)
+        parts = [float(part) for part in str(etr).strip().split(':')]
+        seconds = 0.0
+        for part in parts[-3:]:
+            seconds = seconds * 60 + part
+        if 3 < len(parts):
+            seconds += parts[-4] * 86400
+        return seconds
+    except ValueError:
+        return None
+
+
+def format_etr(seconds):
+    '''Return *seconds* formatted as Accsyn estimated time remaining 
+    ("[D:]HH:MM:SS"), empty string if unknown.'''
+    if seconds is None:
+        return ''
+    seconds = int(round(seconds))
+    (days, seconds) = divmod(seconds, 86400)
+    (hours, seconds) = divmod(seconds, 3600)
+    (minutes, seconds) = divmod(seconds, 60)
+    return '{}{:02d}:{:02d}:{:02d}'.format('{}:'.format(days) if days else 
+        '', hours, minutes, seconds)
+
+
+class PathMapper(object):
+    '''Map raw filesystem paths to Accsyn paths, relative a root share.
+
+    Built once per run from root *rules* and names of involved projects, 
+    further projects added through add_projects() as they are encountered. 
+    Each rule being a dict with keys:
+
+        prefix;   Path prefix to strip, paths beneath are relative the share.
+        location; Restrict prefix rule to paths resolved from this location.
+        project;  Apply share override to paths within this project.
+        share;    Accsyn share paths are relative, default root share if 
+                  omitted.
+
+    Prefix rules are compiled once per location into a dict keyed by
+    normalised prefix, looked up once per distinct prefix length, longest
+    first. Paths not matching any prefix fall back on stripping everything
+    before the first path element being a project name, projects assumed to
+    reside directly beneath the root share; a plain substring search if only
+    one project is involved, else a single regular expression. Both operate
+    on the path lowercased and separators normalised once, sparing the case
+    insensitive matching per path.
+    '''
+
+    def __init__(self, project_names, rules=None):
+        self.rules = list(rules or [])
+        self.mapped = 0
+        self.rejected = 0
+        self.project_shares = dict((rule['project'].lower(), rule['share']) 
+            for rule in self.rules if rule.get('project') and 
+            rule.get('share') and not rule.get('prefix'))
+        self.project_names = set()
+        # Normalised project path elements, '/name/', longest first
+        self._project_elements = ()
+        self._project_expression = None
+        self.add_projects(project_names)
+        # Location name => (prefix lengths longest first, {prefix: rule})
+        self._prefixes = {}
+
+    def add_projects(self, project_names):
+        '''Add *project_names* to names recognised by the fallback, 
+        recompiling it if any of them are new.'''
+        project_names = set(project_names)
+        if self.project_names and project_names <= self.project_names:
+            return
+        self.project_names |= project_names
+        names = sorted(set(name.lower() for name in self.project_names) | 
+            set(self.project_shares), key=len, reverse=True)
+        self._project_elements = tuple('/{}/'.format(name) for name in names)
+        # Anchored on a literal separator, matched on the normalised path 
+        # padded with separators
+        self._project_expression = re.compile(r'/({})(?=/)'.format(
+            '|'.join(re.escape(name) for name in names))) if names else None
+
+    @staticmethod
+    def _normalise(path):
+        return path.replace('\\', '/').lower()
+
+    def _compile(self, location_name):
+        rules = {}
+        for rule in self.rules:
+            if rule.get('prefix') and rule.get('location') in (None, 
+                    location_name):
+                rules.setdefault(
+                    self._normalise(rule['prefix']).rstrip('/') + '/', rule)
+        self._prefixes[location_name] = (tuple(sorted(set(len(prefix) 
+            for prefix in rules), reverse=True)), rules)
+        return self._prefixes[location_name]
+
+    def _map(self, paths):
+        result = []
+        append = result.append
+        compiled = self._prefixes
+        project_shares = self.project_shares
+        expression = self._project_expression
+        element = self._project_elements[0] if len(
+            self._project_elements) == 1 else None
+        for (p_raw, location_name) in paths:
+            (lengths, rules) = compiled.get(location_name) or \
+                self._compile(location_name)
+            normalised = p_raw.replace('\\', '/').lower()
+            p = share = None
+            for length in lengths:
+                rule = rules.get(normalised[:length])
+                if rule is not None:
+                    p = p_raw[length:].lstrip('\\/')
+                    share = rule.get('share')
+                    if not share and project_shares:
+                        share = project_shares.get(normalised[length:]
+                            .lstrip('/').split('/', 1)[0])
+                    break
+            else:
+                if element is not None:
+                    start = ('/' + normalised + '/').find(element)
+                    if start != -1:
+                        p = p_raw[start:]
+                        share = project_shares.get(element[1:-1])
+                elif expression is not None:
+                    match = expression.search('/' + normalised + '/')
+                    if match:
+                        p = p_raw[match.start():]
+                        share = project_shares.get(match.group(1))
+            append('share={}/{}'.format(share, p) if share and p is not None
+                else p)
+        return result
+
+    def map_path(self, p_raw, location_name=None):
+        '''Return Accsyn path for raw path *p_raw* resolved from location
+        *location_name*, None if it cannot be mapped.'''
+        return self._map([(p_raw, location_name)])[0]
+
+    def map_paths(self, paths):
+        '''Map *paths*, a list of (raw path, location name) tuples, return 
+        list with Accsyn path (None if rejected) for each.'''
+        result = self._map(paths)
+        rejected = result.count(None)
+        self.rejected += rejected
+        self.mapped += len(result) - rejected
+        return result
+
+
+class PathResolver(object):
+    '''Resolve filesystem paths of components, grouped by location.
+
+    How each location resolves paths is decided once, by its accessor:
+
+        direct;   A plain disk accessor (of *direct_accessors* types, ftrack 
+                  DiskAccessor by default); path joined from accessor prefix
+                  and the prefetched resource identifier, as the accessor 
+                  would, without calling it.
+        accessor; Any other accessor; called with the prefetched resource 
+                  identifier on a pool of *max_workers* threads, as custom
+                  accessors may be slow or do I/O.
+        fallback; No usable accessor, or a location transforming resource 
+                  identifiers before handing them to its accessor; 
+                  location.get_filesystem_path is called serially as it may
+                  query the session.
+
+    A component is resolved on the pool only if all its candidates can be 
+    resolved by accessor or direct, having a resource identifier prefetched.
+    Locations named in *excluded* are skipped. Like before, a component gets
+    the path of the first location resolving it to a non empty path. 
+    Resolved, fallback and failed paths are counted per location.
+    '''
+
+    def __init__(self, logger, excluded=None, max_workers=8, 
+            direct_accessors=None):
+        self.logger = logger
+        self.excluded = set(excluded or [])
+        self.max_workers = max_workers
+        self.direct_accessors = tuple(direct_accessors or 
+            [ftrack_api.accessor.disk.DiskAccessor])
+        # Location id => (mode, prefix)
+        self._locations = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        # Location name => Counter of resolved, fallback and failed paths
+        self.stats = collections.defaultdict(collections.Counter)
+
+    def _location(self, location):
+        result = self._locations.get(location['id'])
+        if result is None:
+            accessor = getattr(location, 'accessor', None)
+            if getattr(location, 'resource_identifier_transformer', 
+                    None) is not None:
+                # Only the location knows the identifier accessor expects
+                result = ('fallback', None)
+            elif type(accessor) in self.direct_accessors and isinstance(
+                    getattr(accessor, 'prefix', None), str):
+                result = ('direct', accessor.prefix)
+            elif callable(getattr(accessor, 'get_filesystem_path', None)):
+                result = ('accessor', None)
+            else:
+                result = ('fallback', None)
+            self.logger.info('Resolving paths at location {} by {}{}.'.format(
+                location['name'], result[0], ' (prefix: {})'.format(
+                    result[1]) if result[1] else ''))
+            self._locations[location['id']] = result
+        return result
+
+    def _count(self, location, key):
+        with self._lock:
+            self.stats[location['name']][key] += 1
+
+    def _resolve(self, component, candidates):
+        '''Return (path, location name, location id) of *component* from 
+        first of *candidates*, (location, mode, prefix, resource identifier)
+        tuples, resolving it to a non empty path. (None, None, None) if none 
+        does.'''
+        for (location, mode, prefix, resource_identifier) in candidates:
+            try:
+                if mode == 'direct':
+                    if not resource_identifier:
+                        continue
+                    p_raw = os.path.normpath(os.path.join(prefix, 
+                        resource_identifier))
+                    if prefix and not p_raw.startswith(prefix):
+                        raise Exception('Resource identifier "{}" resolves '
+                            'outside accessor prefix!'.format(
+                                resource_identifier))
+                elif mode == 'accessor' and resource_identifier:
+                    p_raw = location.accessor.get_filesystem_path(
+                        resource_identifier)
+                else:
+                    p_raw = location.get_filesystem_path(component)
+                    self._count(location, 'fallback')
+            except:
+                self._count(location, 'failed')
+                self.logger.warning('   {}@{}; {}'.format(component['name'], 
+                    location['name'], traceback.format_exc()))
+                continue
+            if 0<len(p_raw or ''):
+                self._count(location, 'resolved')
+                return (p_raw, location['name'], location['id'])
+        return (None, None, None)
+
+    def resolve(self, components):
+        '''Return list of (path, location name, location id) for each of 
+        *components*, (None, None, None) if no path could be resolved.'''
+        result = []
+        pooled = []
+        for component in components:
+            candidates = []
+            for d in component['component_locations']:
+                location = d['location']
+                if location['name'] in self.excluded:
+                    continue
+                (mode, prefix) = self._location(location)
+                candidates.append((location, mode, prefix, 
+                    d['resource_identifier']))
+            modes = set(candidate[1] for candidate in candidates)
+            # Without resource identifier an accessor candidate falls back
+            # on the location, which must not be called from the pool
+            if 1 < self.max_workers and 'accessor' in modes and \
+                    not 'fallback' in modes and \
+                    candidates[0][1] != 'direct' and all(resource_identifier
+                    for (location, mode, prefix, resource_identifier) in 
+                    candidates if mode == 'accessor'):
+                result.append(None)
+                pooled.append((len(result) - 1, component, candidates))
+            else:
+                result.append(self._resolve(component, candidates))
+        if pooled:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+            futures = [(idx, self._executor.submit(self._resolve, component,
+                candidates)) for (idx, component, candidates) in pooled]
+            for (idx, future) in futures:
+                result[idx] = future.result()
+        return result
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def summary(self):
+        return '; '.join('{}: {} resolved, {} fallback, {} failed'.format(
+            name, stats['resolved'], stats['fallback'], stats['failed']) 
+            for (name, stats) in sorted(self.stats.items())) or 'no paths'
+
+
+def split_tasks(tasks, max_tasks, max_bytes):
+    '''Split Accsyn *tasks* into parts of at most *max_tasks* tasks and
+    *max_bytes* JSON encoded bytes, return list of (start, end) index
+    ranges.'''
+    parts = []
+    start = size = 0
+    for (idx, task) in enumerate(tasks):
+        task_size = len(json.dumps(task)) + 2
+        if start < idx and (max_tasks <= idx - start or 
+                max_bytes < size + task_size):
+            parts.append((start, idx))
+            start = idx
+            size = 0
+        size += task_size
+    if start < len(tasks):
+        parts.append((start, len(tasks)))
+    return parts
+
+
+def list_local_directory(path):
+    '''Return (files, directories) tuple with names within local directory
+    *path*, None if it cannot be listed.'''
+    files = []
+    directories = []
+    try:
+        for entry in os.scandir(path):
+            (directories if entry.is_dir() else files).append(entry.name)
+    except OSError:
+        return None
+    return (files, directories)
+
+
+class LocalStatProvider(object):
+    '''Stat files on the local filesystem, *max_workers* at a time.
+
+    Stat providers return a dict mapping each path to a (size, mtime, 
+    checksum) tuple, or None if the file could not be stat:ed. A provider 
+    querying Accsyn for files at a remote site can be plugged in instead, 
+    having the same *stat* signature.
+    '''
+
+    def __init__(self, max_workers=8, checksum=False):
+        self.max_workers = max(1, max_workers)
+        self.checksum = checksum
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        checksum = None
+        if self.checksum:
+            md5 = hashlib.md5()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    md5.update(block)
+            checksum = md5.hexdigest()
+        return (st.st_size, int(st.st_mtime), checksum)
+
+    def stat(self, location_name, paths):
+        '''Return dict with (size, mtime, checksum) of each of *paths* 
+        resolved from location *location_name*, None if unavailable.'''
+        paths = unique(paths)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers) as executor:
+            return dict(zip(paths, executor.map(self._stat, paths)))
+
+
+class SendManifestStore(object):
+    '''Persistent record of file stats for components sent to a location,
+    keyed by component id and location id, stored as JSON at *path*.'''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f)
+        return self._entries
+
+    @staticmethod
+    def _key(component_id, location_id):
+        return '{}@{}'.format(component_id, location_id)
+
+    def get(self, component_id, location_id):
+        '''Return stat recorded when component was last sent to location.'''
+        with self._lock:
+            stat = self._load().get(self._key(component_id, location_id))
+        return tuple(stat) if stat else None
+
+    def update(self, location_id, stats):
+        '''Record *stats*, a dict mapping component id to stat, for 
+        components sent to location and save.'''
+        with self._lock:
+            entries = self._load()
+            for (component_id, stat) in stats.items():
+                entries[self._key(component_id, location_id)] = stat
+            write_atomic(self.path, json.dumps(entries))
+
+
+class ComponentRecord(object):
+    '''Compact record of a component or additional file in a send, holding
+    plain values only so no ftrack entity is kept alive beyond harvest. 
+    With delta sends, *stat* is the (size, mtime, checksum) of the source 
+    file when harvested, recorded once the component has been sent.'''
+
+    __slots__ = ('id', 'name', 'path', 'raw_path', 'location_id', 'stat')
+
+    def __init__(self, id, name, path, raw_path, location_id=None, 
+            stat=None):
+        self.id = id
+        self.name = name
+        self.path = path
+        self.raw_path = raw_path
+        self.location_id = location_id
+        self.stat = stat
+
+    def to_list(self):
+        return [self.id, self.name, self.path, self.raw_path, 
+            self.location_id, self.stat]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+
+class ComponentManifest(object):
+    '''Records of components submitted in a send, in submission order, so 
+    each Accsyn job refers to a (start, end) range of them.
+
+    With a *path*, records are appended to it as JSON lines as they are 
+    added, one file write per Accsyn job, so the manifest can be inspected
+    or loaded to resume a send. They are then not kept in memory; get() 
+    reads a range back from the file, seeking to the byte offset of the 
+    nearest record known to start a line. Without a path, as when a send 
+    has no journal, records are kept in memory.
+    '''
+
+    # Byte offset of every this many records is indexed by load()
+    INDEX_INTERVAL = 1000
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self._count = 0
+        # Indices of records in file, and byte offsets of their lines
+        self._indices = []
+        self._offsets = []
+
+    def __len__(self):
+        return self._count
+
+    def add(self, records):
+        '''Append *records*, return their (start, end) range.'''
+        start = self._count
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(''.join(json.dumps(record.to_list()) + '\n' 
+                    for record in records).encode('utf-8'))
+            if records:
+                self._indices.append(start)
+                self._offsets.append(offset)
+        else:
+            self.records.extend(records)
+        self._count += len(records)
+        return (start, self._count)
+
+    def get(self, start, end):
+        '''Return records in range (*start*, *end*).'''
+        if not self.path:
+            return self.records[start:end]
+        result = []
+        idx = bisect.bisect_right(self._indices, start) - 1
+        if end <= start or idx < 0:
+            return result
+        index = self._indices[idx]
+        with open(self.path, 'rb') as f:
+            f.seek(self._offsets[idx])
+            for line in f:
+                if not line.strip():
+                    continue
+                if end <= index:
+                    break
+                if start <= index:
+                    result.append(ComponentRecord.from_list(
+                        json.loads(line.decode('utf-8'))))
+                index += 1
+        return result
+
+    @classmethod
+    def load(cls, path):
+        '''Return manifest of records in file at *path*, further records 
+        appended.'''
+        manifest = cls(path)
+        if os.path.exists(path):
+            offset = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        if manifest._count % cls.INDEX_INTERVAL == 0:
+                            manifest._indices.append(manifest._count)
+                            manifest._offsets.append(offset)
+                        manifest._count += 1
+                    offset += len(line)
+        return manifest
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SendEstimate(object):
+    '''Size of a send estimated by a dry run, from source file stats 
+    gathered page by page. Files sent to several destinations are counted 
+    once per destination.'''
+
+    def __init__(self):
+        self.file_count = 0
+        self.size = 0
+        self.missing = 0
+        # Accsyn directory => bytes
+        self.directories = collections.Counter()
+
+    def add(self, records, stats):
+        '''Add *records* to send, *stats* mapping raw paths to (size, 
+        mtime, checksum) tuples, or None if file could not be stat:ed.'''
+        for record in records:
+            stat = stats.get(record.raw_path)
+            if stat is None:
+                self.missing += 1
+                continue
+            self.file_count += 1
+            self.size += stat[0]
+            self.directories[os.path.dirname(record.path)] += stat[0]
+
+    def largest_directories(self, count=10):
+        '''Return list of (Accsyn directory, bytes) tuples, largest first.
+        '''
+        return self.directories.most_common(count)
+
+    @property
+    def partial(self):
+        '''True if some files could not be stat:ed, size being a minimum.'''
+        return 0 < self.missing
+
+    def eta(self, speed):
+        '''Return seconds needed to transfer estimate at *speed* MB/s, None
+        if speed is unknown or no file could be stat:ed.'''
+        if not speed or self.file_count == 0:
+            return None
+        return self.size / (speed * 1024 * 1024)
+
+
+class ThroughputHistory(object):
+    '''Average transfer speeds (MB/s) of the most recent successful 
+    sends, stored as JSON at *path*, for estimating how long a send will 
+    take.'''
+
+    def __init__(self, path, max_samples=20):
+        self.path = path
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+            except (IOError, ValueError):
+                logging.warning('Ignoring unreadable throughput history '
+                    '{}: {}'.format(self.path, traceback.format_exc()))
+        return []
+
+    def add(self, speed):
+        '''Record a send transferring at *speed* MB/s on average.'''
+        if not self.path or not speed:
+            return
+        with self._lock:
+            samples = (self._load() + [{'time': int(time.time()), 
+                'speed': round(speed, 2)}])[-self.max_samples:]
+            write_atomic(self.path, json.dumps(samples))
+
+    def speed(self):
+        '''Return (median speed, number of sends) from history, speed 
+        being None if no send is recorded.'''
+        with self._lock:
+            speeds = sorted(sample['speed'] for sample in self._load())
+        if not speeds:
+            return (None, 0)
+        return (speeds[len(speeds) // 2], len(speeds))
+
+
+class RunJournal(object):
+    '''Compact on-disk journal of a send, identified by ftrack job id and 
+    stored as JSON in *directory*, allowing monitoring and post transfer
+    bookkeeping to be resumed should the action process restart.'''
+
+    def __init__(self, directory, job_id):
+        self.path = os.path.join(directory, '{}.json'.format(job_id))
+        # Component records, appended as jobs are submitted
+        self.manifest_path = os.path.join(directory, 
+            '{}.manifest.jsonl'.format(job_id))
+
+    def write(self, data):
+        write_atomic(self.path, json.dumps(data))
+
+    def remove(self):
+        for path in [self.path, self.manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def set_aside(self):
+        '''Rename journal and its manifest so they are kept for inspection,
+        but no longer found by scan().'''
+        for path in [self.path, self.manifest_path]:
+            if os.path.exists(path):
+                os.replace(path, path + '.failed')
+
+    @classmethod
+    def scan(cls, directory):
+        '''Return list of (journal, data) tuples for journals found in 
+        *directory*, data being None if journal could not be read.'''
+        result = []
+        if not os.path.isdir(directory):
+            return result
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            journal = cls(directory, filename[:-len('.json')])
+            try:
+                with open(journal.path, 'r') as f:
+                    result.append((journal, json.load(f)))
+            except (IOError, ValueError):
+                logging.warning('Unreadable journal {}: {}'.format(
+                    filename, traceback.format_exc()))
+                result.append((journal, None))
+        return result
+
+
+class ProgressReporter(object):
+    '''Throttled, structured progress reporting of a send to its ftrack job.
+
+    Messages are buffered and written by *write*, a callable taking the job
+    data dict, at most once every *interval* seconds unless forced. Job data
+    holds the latest message as "description" along with structured 
+    progress fields (phase, counts, bytes, speed, etr, progress percent) set
+    through update(). Message history belongs in the run log, not the job.
+
+    Data still buffered once the interval has passed is flushed from a timer
+    created by *timer_class* (None disables), calling *write* with blocking
+    False. *write* then returns False should the job not be writable right
+    away, the timer trying again after another interval. Reports made with
+    blocking False, from threads that must not wait, are handed over to the
+    timer the same way.
+    '''
+
+    def __init__(self, write, interval=5.0, clock=time.time, 
+            timer_class=threading.Timer):
+        self.write = write
+        self.interval = interval
+        self.clock = clock
+        self.timer_class = timer_class
+        self.fields = collections.OrderedDict()
+        self.description = None
+        self.flush_count = 0
+        self.suppressed = 0
+        self._pending = False
+        self._message_pending = False
+        self._flushed = None
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+        # Held while writing, keeping writes in order
+        self._write_lock = threading.Lock()
+
+    def update(self, **fields):
+        '''Set structured progress *fields*, written on next flush.'''
+        with self._lock:
+            for (key, value) in fields.items():
+                if self.fields.get(key) != value:
+                    self.fields[key] = value
+                    self._pending = True
+        self._schedule()
+
+    def report(self, s, force=False, blocking=True):
+        '''Buffer message *s*, flushing if due or *force*d. Unless 
+        *blocking*, data that cannot be written right away is left to the 
+        timer.'''
+        with self._lock:
+            if self._message_pending:
+                self.suppressed += 1
+            self.description = s
+            self._pending = self._message_pending = True
+            due = force or self._flushed is None or \
+                self.interval <= self.clock() - self._flushed
+        if not due or not self.flush(blocking=blocking):
+            self._schedule()
+        return s
+
+    def flush(self, blocking=True):
+        '''Write buffered message and fields to job, if anything changed. 
+        Return False if not *blocking* and data could not be written right 
+        away.'''
+        if not self._write_lock.acquire(blocking):
+            return False
+        try:
+            with self._lock:
+                if not self._pending:
+                    return True
+                data = collections.OrderedDict(description=self.description)
+                data.update(self.fields)
+                self._pending = self._message_pending = False
+            try:
+                written = self.write(data, blocking) is not False
+            except:
+                with self._lock:
+                    self._pending = True
+                raise
+            with self._lock:
+                if written:
+                    self._flushed = self.clock()
+                    self.flush_count += 1
+                else:
+                    self._pending = True
+            return written
+        finally:
+            self._write_lock.release()
+
+    def _schedule(self, delay=None):
+        '''Start timer flushing pending data once due, unless running.'''
+        with self._lock:
+            if self.timer_class is None or self._timer is not None or \
+                    self._closed or not self._pending:
+                return
+            if delay is None:
+                delay = self.interval
+                if self._flushed is not None:
+                    delay -= self.clock() - self._flushed
+            self._timer = self.timer_class(max(0, delay), self._flush_due)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_due(self):
+        with self._lock:
+            self._timer = None
+        try:
+            written = self.flush(blocking=False)
+        except:
+            logging.warning('Could not write progress: {}'.format(
+                traceback.format_exc()))
+            written = False
+        if not written:
+            self._schedule(self.interval)
+
+    def close(self):
+        '''Stop flushing from timer, data still pending is written by a 
+        final flush() only.'''
+        with self._lock:
+            self._closed = True
+            (timer, self._timer) = (self._timer, None)
+        if timer is not None:
+            timer.cancel()
+
+
+def coalesce_paths(paths, list_directory=None, coverage=1.0, min_files=2):
+    '''Group *paths*, a list of (path, raw path) tuples, into transfer tasks.
+
+    Identical paths are deduplicated. Given *list_directory*, a callable 
+    returning names within a raw directory as a (files, directories) tuple, 
+    paths are arranged in a prefix tree and directories with at least 
+    *min_files* selected files, *coverage* (0-1) of all files beneath them
+    selected and no unselected subdirectory are replaced by a single 
+    directory task. Return list of (path, [indices into *paths*]) tuples.
+    '''
+    groups = collections.OrderedDict()
+    raw_paths = {}
+    for (idx, (p, p_raw)) in enumerate(paths):
+        groups.setdefault(p, []).append(idx)
+        raw_paths.setdefault(p, p_raw)
+    if list_directory is None:
+        return list(groups.items())
+
+    def create_node(path, raw_path):
+        return {'path': path, 'raw': raw_path, 
+            'dirs': collections.OrderedDict(), 
+            'files': collections.OrderedDict()}
+
+    root = create_node(None, None)
+    for p in groups:
+        parts = re.split(r'[\\/]', p)
+        separator = '\\' if '\\' in p else '/'
+        p_raw = raw_paths[p]
+        node = root
+        for depth in range(len(parts) - 1):
+            if not parts[depth] in node['dirs']:
+                path = separator.join(parts[:depth + 1])
+                node['dirs'][parts[depth]] = create_node(path, 
+                    p_raw[:len(p_raw) - len(p)] + path 
+                    if p_raw.endswith(p) else None)
+            node = node['dirs'][parts[depth]]
+        node['files'][parts[-1]] = p
+
+    def evaluate(node):
+        # Count selected and total files beneath node, bottom up
+        selected = len(node['files'])
+        total = 0
+        complete = node['raw'] is not None
+        for child in node['dirs'].values():
+            evaluate(child)
+            selected += child['selected']
+            total += child['total']
+            complete = complete and child['covered']
+        if complete:
+            listing = list_directory(node['raw'])
+            if listing is None:
+                complete = False
+            else:
+                (files, directories) = listing
+                total += len(set(files) | set(node['files']))
+                complete = set(directories) <= set(node['dirs'])
+        node['selected'] = selected
+        node['total'] = total
+        node['covered'] = complete and 0 < total and \
+            coverage <= selected / float(total)
+
+    def indices(node):
+        result = []
+        for p in node['files'].values():
+            result.extend(groups[p])
+        for child in node['dirs'].values():
+            result.extend(indices(child))
+        return result
+
+    def emit(node, result):
+        if node['path'] is not None and node['covered'] and \
+                min_files <= node['selected']:
+            result.append((node['path'], indices(node)))
+            return result
+        for p in node['files'].values():
+            result.append((p, groups[p]))
+        for child in node['dirs'].values():
+            emit(child, result)
+        return result
+
+    for child in root['dirs'].values():
+        evaluate(child)
+    return emit(root, [])
+
+
+def aggregate_job_data(jobs):
+    '''Aggregate progress of several Accsyn jobs, *jobs* being a list of 
+    (job data, weight) tuples, weight typically being number of tasks.'''
+    statuses = [job_data.get('status') or 'pending' for (job_data, weight) 
+        in jobs]
+    total = sum(weight for (job_data, weight) in jobs) or 1
+    progress = 0.0
+    speed = 0.0
+    etrs = []
+    for (job_data, weight) in jobs:
+        try:
+            progress += float(job_data.get('progress') or 0) * weight / total
+            if job_data.get('status') == 'running':
+                speed += float(job_data.get('speed') or 0)
+        except (TypeError, ValueError):
+            pass
+        etr = parse_etr(job_data.get('etr'))
+        if etr is not None and not job_data.get('status') in \
+                JobProgressTracker.FINAL_STATUSES:
+            etrs.append(etr)
+    if all(status in JobProgressTracker.FINAL_STATUSES for status in statuses):
+        status = 'failed' if 'failed' in statuses else \
+            'aborted' if 'aborted' in statuses else 'done'
+    else:
+        status = 'running' if 'running' in statuses else statuses[0]
+    return {
+        'status': status,
+        'statuses': collections.Counter(statuses),
+        'progress': int(progress),
+        'speed': round(speed, 2),
+        'etr': max(etrs) if etrs else '',
+    }
+
+
+class AccsynJobSource(object):
+    '''Source of Accsyn job status updates.
+
+    Polling is the default, a push/subscription based source implements 
+    *wait* to return ids of jobs updated as soon as an update has arrived, 
+    these jobs are then fetched right away, and *fetch* to return the latest
+    data received.
+    '''
+
+    def fetch(self, job_ids):
+        '''Return dict mapping each of *job_ids* to its latest job data.'''
+        raise NotImplementedError()
+
+    def wait(self, timeout):
+        '''Wait up to *timeout* seconds for updates to become available, 
+        return list of ids of jobs updated, None if unknown.'''
+        raise NotImplementedError()
+
+
+class PollingJobSource(AccsynJobSource):
+    '''Poll job status from *accsyn_session*.
+
+    Several jobs are fetched with one "id in (...)" query per *batch_size* 
+    jobs, falling back on one query per job should the batched query fail.
+    Batched queries are retried after *retry_interval* seconds, doubled for 
+    each consecutive failure up to *max_retry_interval*.
+    '''
+
+    def __init__(self, accsyn_session, sleep=time.sleep, batch_size=50, 
+            retry_interval=30.0, max_retry_interval=600.0, clock=time.time):
+        self.accsyn_session = accsyn_session
+        self.sleep = sleep
+        self.batch_size = max(1, batch_size)
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max(retry_interval, max_retry_interval)
+        self.clock = clock
+        self.failures = 0
+        self.call_count = 0
+        self._retry_batched = None
+
+    @property
+    def batched(self):
+        '''True if jobs are currently fetched with batched queries.'''
+        return self._retry_batched is None or \
+            self._retry_batched <= self.clock()
+
+    def fetch(self, job_ids):
+        result = {}
+        if self.batched and 1 < len(job_ids):
+            try:
+                for ids in chunks(list(job_ids), self.batch_size):
+                    self.call_count += 1
+                    for job_data in self.accsyn_session.find(
+                        'Job WHERE id in ({})'.format(','.join(ids))) or []:
+                        result[job_data['id']] = job_data
+                self.failures = 0
+                self._retry_batched = None
+            except Exception as e:
+                interval = min(self.max_retry_interval, 
+                    self.retry_interval * 2 ** self.failures)
+                self.failures += 1
+                self._retry_batched = self.clock() + interval
+                logging.warning('Batched Accsyn job query failed, querying '
+                    'jobs one by one for {:.0f}s. Details: {}'.format(
+                        interval, e))
+        for job_id in job_ids:
+            if job_id in result:
+                continue
+            self.call_count += 1
+            job_data = self.accsyn_session.find_one(
+                'Job WHERE id={}'.format(job_id))
+            if job_data:
+                job_data.setdefault('id', job_id)
+                result[job_id] = job_data
+        return result
+
+    def wait(self, timeout):
+        self.sleep(timeout)
+        return None
+
+
+class JobProgressTracker(object):
+    '''Track progress of a single Accsyn job, deciding when to poll it next
+    and when progress is worth reporting to ftrack.
+
+    Polling backs off while status stays the same, for a running job with a
+    known ETR the interval is scaled to it so the end of the job is not 
+    missed by much.
+    '''
+
+    FINAL_STATUSES = ['done', 'failed', 'aborted']
+
+    def __init__(self, job_id, min_interval=2.0, max_interval=60.0, 
+            report_interval=60.0, backoff=1.5):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.report_interval = report_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.job_data = None
+        self._reported = None
+        self._last_report = None
+
+    @property
+    def finished(self):
+        return (self.job_data or {}).get('status') in self.FINAL_STATUSES
+
+    def update(self, job_data, now):
+        '''Store *job_data* polled at *now*, adapt poll interval and return
+        True if progress should be reported.'''
+        previous = self.job_data
+        self.job_data = job_data
+        status = job_data.get('status')
+
+        if previous is None or previous.get('status') != status:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, 
+                self.max_interval)
+            etr = parse_etr(job_data.get('etr'))
+            if status == 'running' and etr is not None:
+                self.interval = min(self.max_interval, max(self.min_interval,
+                    etr / 10.0))
+
+        try:
+            progress = int(float(job_data.get('progress') or 0))
+        except (TypeError, ValueError):
+            progress = job_data.get('progress')
+        state = (status, progress)
+        if state != self._reported or self.finished or \
+                self.report_interval <= now - self._last_report:
+            self._reported = state
+            self._last_report = now
+            return True
+        return False
+
+
+class AccsynJobMonitor(object):
+    '''Monitor Accsyn jobs through *source* until finished.'''
+
+    def __init__(self, source, min_interval=2.0, max_interval=60.0, 
+            report_interval=60.0, clock=time.time):
+        self.source = source
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.report_interval = report_interval
+        self.clock = clock
+
+    def watch(self, job_ids, on_progress):
+        '''Block until all jobs *job_ids* are finished, calling *on_progress*
+        with job data whenever a job has progress to report. Return dict 
+        mapping job id to final job data.'''
+        trackers = dict((job_id, JobProgressTracker(job_id, 
+            min_interval=self.min_interval, 
+            max_interval=self.max_interval, 
+            report_interval=self.report_interval)) for job_id in job_ids)
+        next_poll = dict((job_id, self.clock() + self.min_interval) 
+            for job_id in job_ids)
+        result = {}
+        while next_poll:
+            updated = self.source.wait(max(0, min(next_poll.values()) - 
+                self.clock())) or []
+            now = self.clock()
+            due = [job_id for job_id in next_poll if next_poll[job_id] <= now 
+                or job_id in updated]
+            if not due:
+                continue
+            updates = self.source.fetch(due)
+            now = self.clock()
+            for job_id in due:
+                job_data = updates.get(job_id)
+                if job_data is None:
+                    raise Exception('Accsyn job {} not found!'.format(job_id))
+                tracker = trackers[job_id]
+                if tracker.update(job_data, now):
+                    on_progress(job_data)
+                if tracker.finished:
+                    result[job_id] = job_data
+                    del next_poll[job_id]
+                else:
+                    next_poll[job_id] = now + tracker.interval
+        return result
+
+
+class SessionPool(object):
+    '''Pool of warm API sessions created by *factory*, at most *max_size*.
+
+    Sessions are checked out exclusively and *reset* when checked back in, 
+    the most recently used session is handed out first to keep it warm. 
+    Sessions idle for *check_interval* seconds or more are verified with 
+    *health_check* on checkout, dead sessions are evicted and replaced.
+    '''
+
+    def __init__(self, factory, max_size=4, reset=None, health_check=None, 
+            check_interval=300.0, close=None):
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.reset = reset
+        self.health_check = health_check
+        self.check_interval = check_interval
+        self.close = close
+        self.logger = logging.getLogger(
+            __name__ + '.' + self.__class__.__name__
+        )
+        self._condition = threading.Condition()
+        # (session, time checked in)
+        self._idle = []
+        self._size = 0
+        self.created = 0
+        self.evicted = 0
+
+    def _create(self):
+        try:
+            session = self.factory()
+        except:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created += 1
+        return session
+
+    def _discard(self, session):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+        self._close(session)
+
+    def _close(self, session):
+        if self.close:
+            try:
+                self.close(session)
+            except:
+                self.logger.warning(traceback.format_exc())
+
+    def checkout(self, blocking=True):
+        '''Return a session for exclusive use, blocking until one is 
+        available. None if not *blocking* and no session is available.'''
+        with self._condition:
+            while not self._idle and self.max_size <= self._size:
+                if not blocking:
+                    return None
+                self._condition.wait()
+            if self._idle:
+                (session, checked_in) = self._idle.pop()
+            else:
+                self._size += 1
+                session = checked_in = None
+        if session is None:
+            return self._create()
+        if self.health_check and \
+                self.check_interval <= time.time() - checked_in:
+            try:
+                self.health_check(session)
+            except Exception as e:
+                self.logger.warning('Evicting dead session {}: {}'.format(
+                    session, e))
+                self.evicted += 1
+                # Replace it, keeping its slot in pool
+                self._close(session)
+                return self._create()
+        return session
+
+    def checkin(self, session):
+        '''Return *session* to pool.'''
+        if self.reset:
+            try:
+                self.reset(session)
+            except:
+                self.logger.warning(traceback.format_exc())
+                self._discard(session)
+                return
+        with self._condition:
+            self._idle.append((session, time.time()))
+            self._condition.notify()
+
+    def metrics(self):
+        with self._condition:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'created': self.created,
+                'evicted': self.evicted,
+            }
+
+
+class LocationCache(object):
+    '''Cache of ftrack location ids and names.
+
+    Locations are refetched when older than *ttl* seconds or invalidated,
+    typically by an ftrack update event on a Location. They are fetched on
+    the session of the caller; the action session when building the launch
+    form and the stage session when preparing a send, never waiting for a 
+    pooled session. Launch form enumerators are prebuilt on fetch, leaving 
+    out *excluded* locations.
+    '''
+
+    def __init__(self, excluded=None, ttl=300.0, clock=time.time):
+        self.excluded = excluded or []
+        self.ttl = ttl
+        self.clock = clock
+        self.logger = logging.getLogger(
+            __name__ + '.' + self.__class__.__name__
+        )
+        self._lock = threading.Lock()
+        self._fetched = None
+        self._by_name = {}
+        self._enumerator = []
+
+    def invalidate(self):
+        with self._lock:
+            self._fetched = None
+
+    def handle_update_event(self, event):
+        '''Invalidate cache if ftrack update *event* concerns a Location.'''
+        for entity in event['data'].get('entities', []):
+            if (entity.get('entityType') or entity.get('entity_type') or 
+                    '').lower() == 'location':
+                self.logger.info('Location {} updated, invalidating cache.'
+                    .format(entity.get('entityId')))
+                self.invalidate()
+                return
+
+    def _fetch(self, session):
+        locations = session.query('select id, name from Location').all()
+        by_name = {}
+        enumerator = []
+        for location in locations:
+            self.logger.info('Got location: {}({})'.format(
+                location['name'], 
+                location['id']))
+            by_name[location['name']] = {
+                'id': location['id'], 
+                'name': location['name']
+            }
+            if location['name'] in self.excluded:
+                # Remove ftrack default ones.
+                continue
+            enumerator.append(
+                {
+                    'label': location['name'],
+                    'value': location['name']
+                }
+            )
+        self._by_name = by_name
+        self._enumerator = enumerator
+        self._fetched = self.clock()
+
+    def _ensure(self, session):
+        with self._lock:
+            if self._fetched is None or \
+                    self.ttl <= self.clock() - self._fetched:
+                self._fetch(session)
+
+    def get(self, session, name):
+        '''Return dict with id and name of location *name*, None if no such
+        location, refetching locations on *session* if needed.'''
+        self._ensure(session)
+        return self._by_name.get(name)
+
+    def enumerator(self, session):
+        '''Return launch form enumerator data for all locations of 
+        interest, refetching locations on *session* if needed.'''
+        self._ensure(session)
+        return [dict(item) for item in self._enumerator]
+
+
+class SendScheduler(object):
+    '''Run sends on a bounded worker pool, monitoring all in-flight Accsyn 
+    jobs from one shared loop.
+
+    Harvesting and submission, as well as post transfer bookkeeping, run on
+    at most *max_workers* threads with at most *max_queue* sends waiting for
+    a worker. Submitted Accsyn jobs are handed over to a single monitor 
+    thread, polling all jobs due through one job source created by 
+    *job_source_factory*. The monitor thread never waits for an ftrack 
+    session, progress is left to the reporter timer of each send should 
+    none be available right away.
+    '''
+
+    def __init__(self, job_source_factory, max_workers=4, max_queue=32, 
+            min_interval=2.0, max_interval=60.0, report_interval=60.0, 
+            clock=time.time):
+        self.job_source_factory = job_source_factory
+        self.max_queue = max_queue
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.report_interval = report_interval
+        self.clock = clock
+        self.logger = logging.getLogger(
+            __name__ + '.' + self.__class__.__name__
+        )
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, max_workers))
+        self._condition = threading.Condition()
+        # Accsyn job id => [send, tracker, time of next poll, results]
+        self._in_flight = {}
+        self._source = None
+        self._monitor_thread = None
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._polls = 0
+
+    def submit(self, send_run):
+        '''Queue *send_run* for execution, return False if queue is full.'''
+        with self._condition:
+            if self.max_queue <= self._queued:
+                self._rejected += 1
+                return False
+            self._queued += 1
+        self._executor.submit(self._prepare, send_run)
+        return True
+
+    def metrics(self):
+        '''Return dict with current queue and in-flight metrics.'''
+        with self._condition:
+            return {
+                'queued': self._queued,
+                'running': self._running,
+                'in_flight': len(self._in_flight),
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'polls': self._polls,
+            }
+
+    def _prepare(self, send_run):
+        with self._condition:
+            self._queued -= 1
+            self._running += 1
+        job_ids = None
+        try:
+            send_run.start()
+            job_ids = send_run.prepare()
+        except Exception as e:
+            send_run.crashed(e)
+        finally:
+            if job_ids:
+                self.watch(send_run, job_ids)
+            else:
+                self._close(send_run)
+            with self._condition:
+                self._running -= 1
+
+    def _finish(self, send_run, jobs_data):
+        with self._condition:
+            self._running += 1
+        try:
+            send_run.finish(jobs_data)
+        except Exception as e:
+            send_run.crashed(e)
+        finally:
+            self._close(send_run)
+            with self._condition:
+                self._running -= 1
+
+    def _close(self, send_run):
+        try:
+            send_run.close()
+        except:
+            self.logger.warning(traceback.format_exc())
+        with self._condition:
+            self._completed += 1
+
+    def watch(self, send_run, job_ids):
+        '''Hand Accsyn jobs *job_ids* of *send_run* over to the monitor loop,
+        finishing send when all of them are finished.'''
+        # Final job data of each job, shared by all jobs of send
+        results = dict((job_id, None) for job_id in job_ids)
+        with self._condition:
+            for job_id in job_ids:
+                self._in_flight[job_id] = [send_run, JobProgressTracker(
+                    job_id,
+                    min_interval=self.min_interval,
+                    max_interval=self.max_interval,
+                    report_interval=self.report_interval), 
+                    self.clock() + self.min_interval, results]
+            if self._monitor_thread is None:
+                self._monitor_thread = threading.Thread(target=self._monitor)
+                self._monitor_thread.daemon = True
+                self._monitor_thread.start()
+            self._condition.notify()
+
+    def _monitor(self):
+        while True:
+            with self._condition:
+                while not self._in_flight:
+                    self._condition.wait()
+                now = self.clock()
+                due = [job_id for (job_id, entry) in self._in_flight.items()
+                    if entry[2] <= now]
+                # Wake up at least every min interval to pick up new jobs
+                timeout = min([entry[2] - now for entry in 
+                    self._in_flight.values()] + [self.min_interval])
+            if not due:
+                try:
+                    if self._source is None:
+                        self._source = self.job_source_factory()
+                    updated = self._source.wait(max(0, timeout)) or []
+                except:
+                    self.logger.warning(traceback.format_exc())
+                    self._source = None
+                    with self._condition:
+                        self._condition.wait(max(0, timeout))
+                    continue
+                with self._condition:
+                    # Pushed updates are fetched right away
+                    now = self.clock()
+                    for job_id in updated:
+                        if job_id in self._in_flight:
+                            self._in_flight[job_id][2] = now
+                continue
+            try:
+                self._poll(due)
+            except:
+                self.logger.warning(traceback.format_exc())
+                # Start over with a new source and Accsyn session, the 
+                # current one might be broken
+                self._source = None
+                with self._condition:
+                    for job_id in due:
+                        if job_id in self._in_flight:
+                            self._in_flight[job_id][2] = self.clock() + \
+                                self.max_interval
+
+    def _poll(self, job_ids):
+        '''Fetch all Accsyn jobs *job_ids* at once and dispatch updates.'''
+        if self._source is None:
+            self._source = self.job_source_factory()
+        updates = self._source.fetch(job_ids)
+        now = self.clock()
+        for job_id in job_ids:
+            with self._condition:
+                self._polls += 1
+                (send_run, tracker, next_poll, results) = \
+                    self._in_flight[job_id]
+            job_data = updates.get(job_id)
+            try:
+                if job_data is None:
+                    job_data = {'id': job_id, 'status': 'failed', 
+                        'code': job_id, 'speed': 0, 'progress': 0}
+                    send_run.error('Accsyn job {} not found!'.format(job_id),
+                        blocking=False)
+                if tracker.update(job_data, now):
+                    send_run.report_progress(job_data, blocking=False)
+            except:
+                self.logger.warning(traceback.format_exc())
+            finished = False
+            with self._condition:
+                if tracker.finished:
+                    del self._in_flight[job_id]
+                    results[job_id] = job_data
+                    finished = all(results.values())
+                else:
+                    self._in_flight[job_id][2] = now + tracker.interval
+            if finished:
+                self._executor.submit(self._finish, send_run, dict(results))
+
+
+class AccsynSendRun(object):
+    '''A single send of components beneath selected *entities* from one 
+    location to another, as launched by *action* through *event*.
+
+    The send is split in stages so monitoring of the Accsyn job can be 
+    handed over to a shared scheduler; start() creates the ftrack job, 
+    prepare() harvests components and submits the Accsyn job, finish() 
+    registers components at destination once the Accsyn job has finished and
+    close() sets the final ftrack job status. Sessions are checked out from
+    the action session pools for the duration of each stage only.
+    '''
+
+    def __init__(self, action, event, entities):
+        self.action = action
+        self.event = event
+        self.entities = entities
+        self.values = event['data']['values']
+        self.user = event['source']['user']
+        self.logger = logging.getLogger(
+            __name__ + '.' + action.__class__.__name__ + '.thread'
+        )
+        # Sessions of current stage, each thread checks out its own
+        self._stage = threading.local()
+        self.job_id = None
+        self.job_final_status = 'done'
+        self.component_count = 0
+        self.source_location = None
+        # One or more, components are harvested once and sent to each
+        self.destination_locations = []
+        self.lazy_loads = None
+        self.metrics = action.metrics_class() if action.instrument_sends \
+            else None
+        self.task_count = 0
+        # Destination location id => number of Accsyn jobs submitted
+        self.part_counts = collections.Counter()
+        self.skipped_count = 0
+        self.removed_count = 0
+        self.submitted_bytes = 0
+        # Accsyn job id => {'tasks': number of tasks, 'records': (start, 
+        # end) range in manifest, 'destination': destination location id}
+        self.accsyn_jobs = collections.OrderedDict()
+        self.manifest = ComponentManifest()
+        self.phase = None
+        self.journal = None
+        # True once Accsyn jobs are done and components registered
+        self.finished = False
+        self.accsyn_jobs_data = {}
+        # Dry run; harvest and estimate size and transfer time, send nothing
+        self.dry_run = bool(self.values.get('dry_run'))
+        # Sum and number of speeds polled while transferring, average is 
+        # recorded in throughput history when send succeeds
+        self.speed_total = 0.0
+        self.speed_samples = 0
+        self.reporter = ProgressReporter(self._write_job, 
+            interval=action.job_update_interval)
+        self._log_handler = None
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        '''Time a step of send as *name*, if instrumented.'''
+        if self.metrics is None:
+            yield
+            return
+        with self.metrics.timed(name):
+            yield
+
+    @property
+    def session(self):
+        '''ftrack session checked out by current thread, None outside of a
+        stage.'''
+        return getattr(self._stage, 'session', None)
+
+    @session.setter
+    def session(self, session):
+        self._stage.session = session
+
+    @property
+    def accsyn_session(self):
+        '''Accsyn session checked out by current thread, if any.'''
+        return getattr(self._stage, 'accsyn_session', None)
+
+    @accsyn_session.setter
+    def accsyn_session(self, session):
+        self._stage.accsyn_session = session
+
+    @contextlib.contextmanager
+    def sessions(self, accsyn=False):
+        '''Check out an ftrack session, and an Accsyn session if *accsyn*, 
+        for the duration of a stage in current thread. Reentrant.
+        Stages only check out the sessions they use, so an exhausted pool 
+        does not hold up stages not needing it.'''
+        if self.session is None:
+            ftrack_pool = self.action.get_ftrack_session_pool()
+            self.session = ftrack_pool.checkout()
+            try:
+                if self.metrics:
+                    self.metrics.instrument(self.session, 'ftrack', 
+                        RunMetrics.FTRACK_METHODS)
+                if self.lazy_loads:
+                    self.lazy_loads.install(self.session)
+                with self.sessions(accsyn=accsyn):
+                    yield
+            finally:
+                if self.lazy_loads:
+                    self.lazy_loads.uninstall(self.session)
+                if self.metrics:
+                    RunMetrics.release(self.session, 
+                        RunMetrics.FTRACK_METHODS)
+                ftrack_pool.checkin(self.session)
+                self.session = None
+        elif accsyn and self.accsyn_session is None:
+            accsyn_pool = self.action.get_accsyn_session_pool()
+            self.accsyn_session = accsyn_pool.checkout()
+            try:
+                if self.metrics:
+                    self.metrics.instrument(self.accsyn_session, 'accsyn', 
+                        RunMetrics.ACCSYN_METHODS)
+                yield
+            finally:
+                if self.metrics:
+                    RunMetrics.release(self.accsyn_session, 
+                        RunMetrics.ACCSYN_METHODS)
+                accsyn_pool.checkin(self.accsyn_session)
+                self.accsyn_session = None
+        else:
+            yield
+
+    def _write_job(self, data, blocking=True):
+        '''Write *data* to ftrack job, return False if not *blocking* and 
+        no session was available right away.'''
+        if not self.job_id:
+            return True
+        if self.session is None and not blocking:
+            # Flushed from timer, never wait for a session
+            ftrack_pool = self.action.get_ftrack_session_pool()
+            session = ftrack_pool.checkout(blocking=False)
+            if session is None:
+                return False
+            try:
+                self._update_job(session, data)
+            finally:
+                ftrack_pool.checkin(session)
+            return True
+        with self.sessions():
+            self._update_job(self.session, data)
+        return True
+
+    def _update_job(self, session, data):
+        # Fetched each time, session is reset while harvesting
+        job = session.get('Job', self.job_id)
+        job['data'] = json.dumps(data)
+        session.commit()
+
+    def _open_log(self):
+        '''Tag log records of send with its ftrack job id, also logging them
+        to a rotating file of its own named after the job.'''
+        # One logger is shared by all sends, a logger per send would never 
+        # be released
+        job_id = self.job_id
+        self.logger = logging.LoggerAdapter(self.logger, {'job_id': job_id})
+        if not self.action.log_directory:
+            return
+        try:
+            os.makedirs(self.action.log_directory, exist_ok=True)
+            self._log_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(self.action.log_directory, '{}.log'.format(
+                    self.job_id)), 
+                maxBytes=self.action.log_max_bytes, 
+                backupCount=self.action.log_backup_count)
+        except:
+            self.logger.warning('Could not open log file: {}'.format(
+                traceback.format_exc()))
+            return
+        self._log_handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(message)s'))
+        self._log_handler.addFilter(
+            lambda record: getattr(record, 'job_id', None) == job_id)
+        self.logger.logger.addHandler(self._log_handler)
+        self.reporter.update(log=self._log_handler.baseFilename)
+
+    def _close_log(self):
+        if self._log_handler:
+            self.logger.logger.removeHandler(self._log_handler)
+            self._log_handler.close()
+            self._log_handler = None
+
+    def info(self, s, blocking=True):
+        self.logger.info(s)
+        return self.reporter.report(s, blocking=blocking)
+
+    def warning(self, s, blocking=True):
+        self.logger.warning(s)
+        return self.reporter.report(s, blocking=blocking)
+
+    def web_message(self, s):
+        with self.sessions():
+            self._web_message(s)
+
+    def _web_message(self, s):
+        self.session.event_hub.publish(
+            ftrack_api.event.base.Event(
+                topic='ftrack.action.trigger-user-interface',
+                data=dict(
+                    type='message',
+                    success=False,
+                    message=(s)
+                ),
+                target='applicationId=ftrack.client.web and user.id={0}'
+                .format(self.user['id'])
+            ),
+            on_error='ignore'
+        )
+
+    def error(self, s, blocking=True):
+        '''Report error *s* right away, also to user in web UI. Unless 
+        *blocking*, it is written to job by reporter timer should no session
+        be available, and user is left to be notified once send finishes.'''
+        self.logger.error(s)
+        self.reporter.report(s, force=True, blocking=blocking)
+        if blocking:
+            self.web_message('[ERROR] {}'.format(s))
+        return s
+
+    def crashed(self, e):
+        '''Report send crashed with exception *e*, to be called from within
+        exception handler.'''
+        self.warning(traceback.format_exc())
+        self.error('Accsyn send CRASHED! Details: {}'.format(str(e)))
+        self.job_final_status = 'failed'
+
+    def run(self):
+        '''Run send start to finish in current thread, monitoring the Accsyn
+        job until done. Return number of components/files sent.'''
+        self.start()
+        try:
+            job_ids = self.prepare()
+            if job_ids:
+                with self.sessions(accsyn=True):
+                    monitor = AccsynJobMonitor(
+                        self.action.job_source_class(self.accsyn_session),
+                        min_interval=self.action.monitor_min_interval,
+                        max_interval=self.action.monitor_max_interval,
+                        report_interval=self.action.monitor_report_interval)
+                    jobs_data = monitor.watch(job_ids, self.report_progress)
+                self.finish(jobs_data)
+        except Exception as e:
+            self.crashed(e)
+        finally:
+            self.close()
+
+        return self.component_count
+
+    def start(self):
+        '''Create the ftrack job reporting progress.'''
+        if self.action.count_lazy_loads:
+            self.lazy_loads = LazyLoadCounter()
+        if self.metrics:
+            self.metrics.enter('starting')
+
+        self.logger.info('Creating ftrack job..')
+
+        with self.sessions():
+            # Create a new running Job.     
+            job = self.session.create(
+                'Job',
+                {
+                    'user': self.session.get('User', self.user['id']),
+                    'status': 'running',
+                    'data': json.dumps({
+                        'description': 'Initialising Accsyn send...'
+                        }
+                    )
+                }
+            )
+            self.session.commit()
+            self.job_id = job['id']
+
+        self._open_log()
+        self.write_journal('preparing')
+
+    def write_journal(self, phase):
+        '''Enter *phase*, journaling state needed to resume send.'''
+        if phase != self.phase:
+            if self.metrics:
+                self.metrics.enter(phase)
+            self.reporter.update(phase=phase)
+            self.reporter.flush()
+        self.phase = phase
+        if not self.action.journal_directory or not self.job_id:
+            return
+        if self.journal is None:
+            self.journal = RunJournal(self.action.journal_directory, 
+                self.job_id)
+            if not self.manifest.path and not len(self.manifest):
+                self.manifest.path = self.journal.manifest_path
+        try:
+            self.journal.write({
+                'phase': phase,
+                'job_id': self.job_id,
+                'user': {'id': self.user['id']},
+                'values': self.values,
+                'source_location': self.source_location,
+                'destination_locations': self.destination_locations,
+                'accsyn_jobs': list(self.accsyn_jobs.items()),
+                'component_count': self.component_count,
+            })
+        except:
+            self.logger.warning('Could not write journal: {}'.format(
+                traceback.format_exc()))
+
+    @classmethod
+    def from_journal(cls, action, data):
+        '''Return send restored from journal *data*, ready to be monitored.
+        '''
+        send_run = cls(action, {
+            'source': {'user': data['user']},
+            'data': {'values': data['values']}
+        }, [])
+        send_run.job_id = data['job_id']
+        send_run.source_location = data['source_location']
+        send_run.destination_locations = data['destination_locations']
+        send_run.accsyn_jobs = collections.OrderedDict(data['accsyn_jobs'])
+        send_run.component_count = data['component_count']
+        send_run.phase = data['phase']
+        send_run.reporter.update(phase=data['phase'], 
+            components=data['component_count'], 
+            jobs=len(send_run.accsyn_jobs))
+        send_run._open_log()
+        send_run.journal = RunJournal(action.journal_directory, 
+            data['job_id'])
+        send_run.manifest = ComponentManifest.load(
+            send_run.journal.manifest_path)
+        return send_run
+
+    def prepare(self):
+        '''Harvest components, evaluate paths, submit Accsyn job and remove
+        components from destination location. Return list of submitted 
+        Accsyn job ids, None if there was nothing to send.'''
+        # Accsyn jobs are submitted on sessions of their own
+        with self.sessions():
+            return self._prepare()
+
+    def _prepare(self):
+        session = self.session
+        action = self.action
+        info = self.info
+        error = self.error
+        values = self.values
+
+        source_location_name = values['source_location']
+
+        info('Fetching locations..')
+
+        location_cache = action.get_location_cache()
+
+        # Get the source location.
+        source_location = self.source_location = location_cache.get(
+            session, source_location_name)
+
+        assert (not source_location is None),('No such source location!')
+
+        # Get the destination location(s).
+        destination_locations = self.destination_locations = []
+        for destination_location_name in parse_location_names(
+                values['destination_location']):
+            destination_location = location_cache.get(
+                session, destination_location_name)
+            assert (not destination_location is None),(
+                'No such destination location: {}!'.format(
+                    destination_location_name))
+            destination_locations.append(destination_location)
+
+        assert (0 < len(destination_locations)),(
+            'No destination location!')
+        self.reporter.update(destinations=[location['name'] for location in 
+            destination_locations])
+
+        if self.dry_run:
+            info('Dry run, estimating size of send without transferring..')
+            self.reporter.update(dry_run=True)
+        info("Harvesting components..")
+
+        # Components are streamed from paged queries through path evaluation
+        # into batches of tasks, each batch submitted to Accsyn as soon as it
+        # is full while harvest continues. The session is reset after each 
+        # page to release the components. Should more
+        # than submit_workers submits be in flight, harvest waits for the 
+        # oldest to finish, bounding the number of batches held in memory.
+        # Each destination gets batches, Accsyn jobs and ComponentLocation 
+        # bookkeeping of its own, from the same harvest. A directory can only
+        # be coalesced once all of its selected files are known, so when 
+        # coalescing, records are held and submitted once harvest is done.
+        started = time.time()
+        bookkeepers = dict((location['id'], ComponentLocationBookkeeper(
+            session, location, self.logger, 
+            chunk_size=action.query_chunk_size, 
+            commit_batch_size=action.commit_batch_size)) 
+            for location in destination_locations)
+        harvester = resolver = None
+        estimate = SendEstimate() if self.dry_run else None
+        try:
+            harvester = ComponentHarvester(session, 
+                chunk_size=action.query_chunk_size, 
+                page_size=action.harvest_page_size)
+            resolver = PathResolver(self.logger, 
+                excluded=action.excluded_locations, 
+                max_workers=action.path_resolve_workers,
+                direct_accessors=action.direct_path_accessors)
+            mapper = PathMapper([], action.path_rules)
+            project_ids = set()
+            pending = collections.deque()
+            batches = dict((location['id'], []) for location in 
+                destination_locations)
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, action.submit_workers))
+            try:
+                for page in harvester.iter_pages(self.entities):
+                    with self.timed('path_evaluation'):
+                        records = self._evaluate_paths(page, resolver, 
+                            mapper, project_ids, harvester.project_id)
+                    # Release components from session cache, only records 
+                    # are kept from here on
+                    session.reset()
+                    page = None
+                    if action.delta_sends:
+                        with self.timed('delta'):
+                            sends = self._skip_up_to_date(records)
+                        self.component_count += len(set(record for 
+                            destination_records in sends.values() 
+                            for record in destination_records))
+                    else:
+                        sends = dict((location['id'], records) for location 
+                            in destination_locations)
+                        self.component_count += len(records)
+                    if estimate:
+                        with self.timed('estimate'):
+                            self._estimate(estimate, sends)
+                        continue
+                    for location in destination_locations:
+                        batch = batches[location['id']]
+                        for record in sends[location['id']]:
+                            batch.append(record)
+                            if len(batch) >= action.max_tasks_per_job and \
+                                    not action.coalesce_directories:
+                                self._submit_batch(executor, pending, batch, 
+                                    location, bookkeepers)
+                                batch = batches[location['id']] = []
+
+                info('Harvested {} unique component(s) in {} queries, {} '
+                    'context level(s) ({:.2f}s querying, {:.2f}s total).'
+                    .format(harvester.count, harvester.query_count, 
+                        harvester.levels, harvester.elapsed, 
+                        time.time() - started))
+
+                if harvester.count == 0:
+                    error('No components found!')
+                    self.job_final_status = 'failed'
+                    return None
+
+                additional_files = self._evaluate_additional_files(mapper)
+                self.component_count += len(additional_files)
+                if estimate:
+                    with self.timed('estimate'):
+                        self._estimate(estimate, dict((location['id'], 
+                            additional_files) for location in 
+                            destination_locations))
+                else:
+                    for location in destination_locations:
+                        batch = batches[location['id']] + additional_files
+                        if batch:
+                            self._submit_batch(executor, pending, batch, 
+                                location, bookkeepers)
+                while pending:
+                    self._collect_job(pending.popleft(), bookkeepers)
+            except Exception as e:
+                # Accsyn jobs already submitted are running and their 
+                # components removed from destination, keep track of them so
+                # components are registered once done.
+                while pending:
+                    try:
+                        self._collect_job(pending.popleft(), bookkeepers)
+                    except:
+                        self.logger.warning(traceback.format_exc())
+                if not self.accsyn_jobs:
+                    raise
+                self.crashed(e)
+                error('Send interrupted after submitting {} Accsyn job(s), '
+                    'these are monitored and their components registered at '
+                    'destination when done. Please launch again to send the '
+                    'rest!'.format(len(self.accsyn_jobs)))
+            finally:
+                executor.shutdown()
+        finally:
+            if resolver:
+                resolver.close()
+            if self.metrics and harvester:
+                self.metrics.add_time('harvest', harvester.elapsed)
+
+        info('Resolved paths ({}), mapped {}, rejected {}.'.format(
+            resolver.summary(), mapper.mapped, mapper.rejected))
+        if self.lazy_loads:
+            info('Path evaluation done, {}.'.format(
+                self.lazy_loads.summary()))
+
+        if estimate:
+            self._report_estimate(estimate)
+            return None
+
+        if self.component_count == 0:
+            if mapper.mapped == 0:
+                error('[ERROR] No components/additional files left after '
+                    'extracting paths!')
+                self.job_final_status = 'failed'
+            else:
+                info('All components up to date at destination(s), nothing '
+                    'to send.')
+            return None
+
+        if len(self.accsyn_jobs) == 0:
+            raise Exception('None of the Accsyn jobs could be submitted!')
+        self.write_journal('monitoring')
+
+        info('Submitted {} component(s)/file(s) to {} as {} task(s) in {} '
+            'job(s) (id(s): {}), compression ratio {:.1f}x{}; removed {} '
+            'from destination location(s) ({}), {:.2f}s.'.format(
+                self.component_count, ', '.join(location['name'] for 
+                    location in destination_locations), 
+                self.task_count, len(self.accsyn_jobs), 
+                ', '.join(self.accsyn_jobs.keys()), 
+                self.component_count * len(destination_locations) / 
+                    float(self.task_count or 1),
+                ', skipped {} up to date'.format(self.skipped_count) 
+                    if action.delta_sends else '',
+                self.removed_count, '; '.join('{}: {}'.format(
+                    location['name'], bookkeepers[location['id']].summary()) 
+                    for location in destination_locations), 
+                time.time() - started))
+
+        return list(self.accsyn_jobs.keys())
+
+    def _evaluate_paths(self, components, resolver, mapper, project_ids, 
+            project_id=None):
+        '''Return records of *components* having a sendable path, resolved by 
+        *resolver*, adding names of projects not among *project_ids* to 
+        *mapper*.'''
+        ids = set(component['version']['asset']['parent']['project_id'] 
+            for component in components)
+        if project_id:
+            ids.add(project_id)
+        ids -= project_ids
+        if ids:
+            project_ids |= ids
+            projects = self.session.query('select name from Project where '
+                'id in ({})'.format(format_ids(ids))).all()
+            self.logger.info('Evaluating paths (project(s): {})..'.format(
+                ', '.join(project['name'] for project in projects)))
+            mapper.add_projects(project['name'] for project in projects)
+
+        # Filter out components like web playables etc, evaulate paths
+        resolved = []
+        for (component, (p_raw, location_name, location_id)) in zip(
+                components, resolver.resolve(components)):
+            if p_raw is None:
+                self.logger.warning('   {}; Empty path!'.format(
+                    component['name']))
+                continue
+            resolved.append((component, p_raw, location_name, location_id))
+
+        # Create Accsyn paths from ftrack paths, configure path rules on 
+        # action to identify and select different root shares if needed.
+        # By default project folders are assumed to be named as ftrack 
+        # project code and reside directly beneath root path.
+        mapped = mapper.map_paths([(p_raw, location_name) for (component, 
+            p_raw, location_name, location_id) in resolved])
+
+        records = []
+        for ((component, p_raw, location_name, location_id), p) in zip(
+                resolved, mapped):
+            if p is None:
+                self.logger.warning('   {}; Path "{}" could be evaluated, does '
+                    'not contain project code!'.format(
+                        component['name'], p_raw)
+                )
+                continue
+            records.append(ComponentRecord(component['id'], 
+                component['name'], p, p_raw, location_id))
+        return records
+
+    def _evaluate_additional_files(self, mapper):
+        '''Return records of additional files entered in launch form.'''
+        additional_files = [p.strip() for p in 
+            self.values['additional_files'].split('\n') if 0<len(p.strip())]
+        records = []
+        for (p_raw, p) in zip(additional_files, mapper.map_paths(
+                [(p, None) for p in additional_files])):
+            if p is None:
+                self.logger.warning('   Additional path "{}" could be '
+                    'evaluated, does not contain project code!'
+                    .format(p_raw))
+                continue
+            records.append(ComponentRecord(None, None, p, p_raw))
+        return records
+
+    def _skip_up_to_date(self, records):
+        '''Return dict mapping id of each destination location to *records*
+        without components already up to date there, being present with 
+        source file unchanged since last sent. Source files are stat:ed once
+        for all destinations.'''
+        manifest = self.action.get_send_manifest()
+        component_ids = [record.id for record in records if record.id]
+        stats = self.action.stat_provider.stat(self.source_location['name'],
+            [record.raw_path for record in records if record.id])
+        for record in records:
+            if record.id and stats.get(record.raw_path) is not None:
+                record.stat = list(stats[record.raw_path])
+
+        result = {}
+        for location in self.destination_locations:
+            bookkeeper = ComponentLocationBookkeeper(self.session, location, 
+                self.logger, chunk_size=self.action.query_chunk_size)
+            existing = bookkeeper.fetch_existing(component_ids)
+            keep = []
+            for record in records:
+                if record.id and record.id in existing:
+                    stat = stats.get(record.raw_path)
+                    if stat is not None and stat == manifest.get(
+                            record.id, location['id']):
+                        continue
+                keep.append(record)
+            self.skipped_count += len(records) - len(keep)
+            result[location['id']] = keep
+        return result
+
+    def _estimate(self, estimate, sends):
+        '''Add *sends*, dict mapping destination location id to records, 
+        to *estimate*. Source files are stat:ed by the action stat provider,
+        unless already stat:ed for a delta send.'''
+        records = unique(record for destination_records in sends.values() 
+            for record in destination_records)
+        stats = dict((record.raw_path, tuple(record.stat)) for record in 
+            records if record.stat is not None)
+        stats.update(self.action.stat_provider.stat(
+            self.source_location['name'], [record.raw_path for record in 
+                records if not record.raw_path in stats]))
+        for destination_records in sends.values():
+            estimate.add(destination_records, stats)
+        self.reporter.update(files=estimate.file_count, bytes=estimate.size)
+
+    def _report_estimate(self, estimate):
+        '''Report size and estimated transfer time of dry run.'''
+        (speed, send_count) = self.action.get_throughput_history().speed()
+        eta = estimate.eta(speed)
+        directories = estimate.largest_directories(
+            self.action.dry_run_directory_count)
+        known = 0 < estimate.file_count
+        # Bytes and ETA are minimums should some files be missing
+        self.reporter.update(components=self.component_count, 
+            files=estimate.file_count, 
+            bytes=estimate.size if known else None, 
+            missing=estimate.missing, partial=estimate.partial, 
+            speed=speed or 0, eta=format_etr(eta),
+            directories=[[p, size] for (p, size) in directories])
+        for (p, size) in directories:
+            self.logger.info('   {}: {}'.format(p, format_size(size)))
+        if not known:
+            size = 'unknown size'
+        elif estimate.partial:
+            size = 'at least {}'.format(format_size(estimate.size))
+        else:
+            size = format_size(estimate.size)
+        if eta is not None:
+            eta = '{}{} at {} MB/s (median of last {} send(s))'.format(
+                'at least ' if estimate.partial else '', format_etr(eta), 
+                speed, send_count)
+        elif not known:
+            eta = 'unknown, no source file could be stat:ed'
+        else:
+            eta = 'unknown, no previous sends recorded'
+        (self.warning if estimate.partial else self.info)(
+            'Dry run; {} file(s), {} to send to {}{}, estimated transfer '
+            'time: {}.'.format(
+                estimate.file_count, size, 
+                ', '.join(location['name'] for location in 
+                    self.destination_locations),
+                ' ({} file(s) not found at source)'.format(estimate.missing)
+                    if estimate.partial else '', eta))
+
+    def _submit_batch(self, executor, pending, batch, destination_location,
+            bookkeepers):
+        '''Submit *batch* of component records to Accsyn on *executor*, as 
+        one or more jobs sending to *destination_location*, queued in 
+        *pending*. Wait for the oldest submits to finish should more than 
+        submit_workers be in flight.'''
+        action = self.action
+        for record in batch:
+            if record.id:
+                self.logger.info('   Adding component "{}"({}), path: {} '
+                    '(raw: {}), destination: {}'.format(record.name, 
+                        record.id, record.path, record.raw_path, 
+                        destination_location['name']))
+            else:
+                self.logger.info('   Adding additional file: {}, '
+                    'destination: {}'.format(record.path, 
+                        destination_location['name']))
+
+        # Deduplicate paths and optionally replace completely selected 
+        # directories with one task each
+        task_entries = coalesce_paths(
+            [(record.path, record.raw_path) for record in batch],
+            list_directory=action.directory_lister 
+                if action.coalesce_directories else None,
+            coverage=action.coalesce_coverage,
+            min_files=action.coalesce_min_files)
+        self.task_count += len(task_entries)
+
+        source_party = format_party(self.source_location['name'])
+        destination_party = format_party(destination_location['name'])
+        tasks = []
+        for (p, indices) in task_entries:
+            tasks.append({
+                'source':'{}:{}'.format(source_party, p),
+                'destination':'{}'.format(destination_party)
+            })
+
+        for (start, end) in split_tasks(tasks, action.max_tasks_per_job, 
+                action.max_job_bytes):
+            records = [batch[idx] for (p, indices) in 
+                task_entries[start:end] for idx in indices]
+            code = 'Transfer of {} components from {} to {}'.format(
+                sum(1 for record in records if record.id), 
+                self.source_location['name'], 
+                destination_location['name'])
+            self.part_counts[destination_location['id']] += 1
+            part = self.part_counts[destination_location['id']]
+            if 1 < part:
+                code = '{} (part {})'.format(code, part)
+            pending.append((executor.submit(self._submit_job, code, 
+                tasks[start:end]), end - start, records, 
+                destination_location['id']))
+            while max(1, action.submit_workers) < len(pending):
+                self._collect_job(pending.popleft(), bookkeepers)
+
+    def _submit_job(self, code, tasks):
+        '''Submit *tasks* as an Accsyn job named *code* on a pooled Accsyn 
+        session, return id of job created.'''
+        accsyn_job_data = {
+            'code': code,
+            'tasks': tasks,
+            'mirror_paths': True
+        }
+        self.logger.debug('Submitting job to Accsyn (JSON: {})..'.format(
+            accsyn_job_data))
+        accsyn_pool = self.action.get_accsyn_session_pool()
+        accsyn_session = accsyn_pool.checkout()
+        if self.metrics:
+            self.metrics.instrument(accsyn_session, 'accsyn', 
+                RunMetrics.ACCSYN_METHODS)
+        try:
+            return accsyn_session.create('Job', accsyn_job_data)['id']
+        finally:
+            if self.metrics:
+                RunMetrics.release(accsyn_session, RunMetrics.ACCSYN_METHODS)
+            accsyn_pool.checkin(accsyn_session)
+
+    def _collect_job(self, submit, bookkeepers):
+        '''Wait for *submit* (future, number of tasks, component records, 
+        destination location id) to finish, add records to manifest, journal
+        the Accsyn job and remove its components from destination location,
+        using its bookkeeper in *bookkeepers*.'''
+        (future, task_count, records, destination_id) = submit
+        try:
+            with self.timed('submit_wait'):
+                job_id = future.result()
+        except Exception as e:
+            self.warning('Submit of {} task(s) to Accsyn FAILED! '
+                'Details: {}'.format(task_count, e))
+            self.job_final_status = 'failed'
+            return
+        self.accsyn_jobs[job_id] = {
+            'tasks': task_count,
+            'records': self.manifest.add(records),
+            'destination': destination_id
+        }
+        self.write_journal('submitting')
+        component_ids = [record.id for record in records if record.id]
+        # Sizes known from source file stats, when sending delta
+        self.submitted_bytes += sum(record.stat[0] for record in records 
+            if record.stat is not None)
+        self.reporter.update(components=self.component_count, 
+            tasks=self.task_count, jobs=len(self.accsyn_jobs),
+            bytes=self.submitted_bytes)
+        bookkeeper = bookkeepers[destination_id]
+        failed = bookkeeper.failed
+        with self.timed('bookkeeping'):
+            self.removed_count += bookkeeper.remove(component_ids)
+        (self.warning if bookkeeper.failed != failed else self.info)(
+            'Submitted Accsyn job {} ({} task(s)) to {}, {} component(s)/'
+            'file(s) submitted so far..'.format(job_id, task_count, 
+                bookkeeper.location['name'], self.component_count))
+
+    def _submitted(self, job_ids=None, destination_id=None):
+        '''Return records of components in submitted Accsyn jobs, restricted
+        to *job_ids* and jobs sending to destination location 
+        *destination_id* if given.'''
+        result = []
+        for (job_id, job) in self.accsyn_jobs.items():
+            if (job_ids is None or job_id in job_ids) and (destination_id is 
+                    None or job['destination'] == destination_id):
+                result.extend(record for record in 
+                    self.manifest.get(*job['records']) if record.id)
+        return result
+
+    def report_progress(self, job_data, blocking=True):
+        '''Report progress of Accsyn job from polled *job_data*, aggregated
+        over all jobs of send. Unless *blocking*, progress is left to the 
+        reporter timer should no session be available right away.'''
+        self.accsyn_jobs_data[job_data['id']] = job_data
+        if len(self.accsyn_jobs) <= 1:
+            self._sample_speed(job_data)
+            self.reporter.update(status=job_data['status'], 
+                speed=job_data['speed'], progress=job_data['progress'], 
+                etr=job_data.get('etr', ''))
+            self.info('{}; {}, {} MB/s, {}%, etr: {}'.format(
+                job_data['code'], 
+                job_data['status'], 
+                job_data['speed'], 
+                job_data['progress'], 
+                job_data.get('etr', '')), blocking=blocking)
+            return
+        aggregate = aggregate_job_data([(self.accsyn_jobs_data.get(job_id,
+            {}), job['tasks']) for (job_id, job) in 
+            self.accsyn_jobs.items()])
+        self._sample_speed(aggregate)
+        self.reporter.update(status=aggregate['status'], 
+            speed=aggregate['speed'], progress=aggregate['progress'], 
+            etr=aggregate['etr'])
+        destinations = ''
+        if 1 < len(self.destination_locations):
+            # Progress of each destination
+            destinations = ' [{}]'.format(', '.join('{}: {}%'.format(
+                location['name'], aggregate_job_data([(
+                    self.accsyn_jobs_data.get(job_id, {}), job['tasks']) 
+                    for (job_id, job) in self.accsyn_jobs.items() 
+                    if job['destination'] == location['id']]
+                )['progress']) for location in self.destination_locations))
+        self.info('{} Accsyn jobs; {} ({}), {} MB/s, {}%, etr: {}{}'.format(
+            len(self.accsyn_jobs), 
+            aggregate['status'],
+            ', '.join('{} {}'.format(count, status) for (status, count) in 
+                sorted(aggregate['statuses'].items())),
+            aggregate['speed'], 
+            aggregate['progress'], 
+            aggregate['etr'],
+            destinations), blocking=blocking)
+
+    def _sample_speed(self, job_data):
+        try:
+            speed = float(job_data.get('speed') or 0)
+        except (TypeError, ValueError):
+            return
+        if job_data.get('status') == 'running' and 0 < speed:
+            self.speed_total += speed
+            self.speed_samples += 1
+
+    def finish(self, jobs_data):
+        '''Handle all Accsyn jobs finished, *jobs_data* mapping job id to 
+        final job data, adding components of successful jobs to destination
+        location.'''
+        with self.sessions():
+            self._finish(jobs_data)
+
+    def _finish(self, jobs_data):
+        info = self.info
+        self.write_journal('finishing')
+        statuses = [job_data['status'] for job_data in jobs_data.values()]
+        if 'failed' in statuses:
+            self.error('{} of {} Accsyn job(s) FAILED! Check Accsyn for '
+                'clues!'.format(statuses.count('failed'), len(statuses)))
+            self.job_final_status = 'failed'
+        elif 'aborted' in statuses:
+            self.web_message(info('[WARNING] {} of {} Accsyn job(s) were '
+                'aborted.'.format(statuses.count('aborted'), len(statuses))))
+        elif self.job_final_status == 'done':
+            self.web_message(info('Accsyn job(s) finished successfully!'))
+
+        # Components of failed jobs are left out of destination location, 
+        # only those of completed jobs are known to be up to date there
+        succeeded = [job_id for (job_id, job_data) in jobs_data.items() 
+            if job_data['status'] != 'failed']
+        done = set(job_id for (job_id, job_data) in jobs_data.items() 
+            if job_data['status'] == 'done')
+        for destination_location in self.destination_locations:
+            records = self._submitted(succeeded, destination_location['id'])
+            if not records:
+                continue
+            info('(Post) Adding components to destination location: {}...'
+                .format(destination_location['name']))
+            started = time.time()
+            bookkeeper = ComponentLocationBookkeeper(self.session, 
+                destination_location, self.logger, 
+                chunk_size=self.action.query_chunk_size, 
+                commit_batch_size=self.action.commit_batch_size)
+            with self.timed('bookkeeping'):
+                added = bookkeeper.add([(record.id, record.raw_path) 
+                    for record in records])
+            (self.warning if bookkeeper.failed else info)(
+                '(Post) Added {} component(s) to destination location {} in '
+                '{:.2f}s ({}).'.format(added, destination_location['name'], 
+                    time.time() - started, bookkeeper.summary()))
+            if self.action.delta_sends:
+                try:
+                    self.action.get_send_manifest().update(
+                        destination_location['id'], dict((record.id, 
+                            record.stat) for record in self._submitted(done,
+                                destination_location['id']) 
+                            if record.stat is not None))
+                except:
+                    # Sent again next time, as not known to be up to date
+                    self.warning('Could not record sent components in send '
+                        'manifest: {}'.format(traceback.format_exc()))
+        self.finished = True
+        info('(Post) Done...')
+
+    def close(self):
+        '''Set final status of ftrack job, flushing progress reported.'''
+        if self.lazy_loads:
+            self.logger.info('Run finished, {}.'.format(
+                self.lazy_loads.summary()))
+        self.logger.info('Run finished, job data flushed {} time(s), {} '
+            'message(s) not written to job.'.format(
+                self.reporter.flush_count, self.reporter.suppressed))
+        if self.metrics:
+            self.metrics.enter('closing')
+        self.reporter.close()
+        if self.job_id:
+            with self.sessions():
+                self.reporter.flush()
+                # This will notify the user in the web ui.
+                job = self.session.get('Job', self.job_id)
+                job['status'] = self.job_final_status
+                self.session.commit()
+        if self.journal:
+            if self.accsyn_jobs and not self.finished:
+                # Components are removed from destination, keep journal so
+                # resume() registers them once Accsyn jobs are done
+                self.logger.warning('Keeping journal {} of unfinished Accsyn '
+                    'job(s) {}, resumed on action restart.'.format(
+                        self.journal.path, ', '.join(self.accsyn_jobs)))
+            else:
+                self.journal.remove()
+        if self.job_final_status == 'done' and self.speed_samples:
+            try:
+                self.action.get_throughput_history().add(
+                    self.speed_total / self.speed_samples)
+            except:
+                self.logger.warning('Could not record throughput: {}'.format(
+                    traceback.format_exc()))
+        if self.metrics:
+            self.metrics.enter(None)
+            self.logger.info('Run metrics; {}.'.format(
+                self.metrics.summary()))
+            try:
+                self.action.get_metrics_registry().add(self.metrics, 
+                    self.job_final_status)
+            except:
+                self.logger.warning('Could not record metrics: {}'.format(
+                    traceback.format_exc()))
+        self._close_log()
+
+
+class AccsynSendAction():
+    def __init__(self, session=None):
+        self.session = session or ftrack_api.Session(
+            auto_connect_event_hub=True)
         #self.session = ftrack_api.Session(auto_connect_event_hub=True)
         self.identifier = 'AccsynSendAction_v1'
         self.logger = logging.getLogger(
@@ -54,6 +3011,107 @@ class AccsynSendAction():
             'ftrack.server', 
             'ftrack.review', 
         ]
+        # Max number of ids resolved in each "in (...)" query.
+        self.query_chunk_size = 100
+        # Components fetched per query page, each page streamed through path
+        # evaluation into Accsyn jobs before the next is fetched.
+        self.harvest_page_size = 500
+        # Log how many attributes are lazy loaded during run, for measuring
+        # effectiveness of harvest projections.
+        self.count_lazy_loads = False
+        # Max number of ComponentLocation changes committed at once.
+        self.commit_batch_size = 500
+        # Accsyn job monitoring; poll interval bounds (adapted to job status 
+        # and ETR), max seconds between progress reports when nothing has
+        # changed and the job status source (a push/subscription source can
+        # be plugged in here, instantiated with the Accsyn session).
+        self.monitor_min_interval = 2.0
+        self.monitor_max_interval = 60.0
+        self.monitor_report_interval = 60.0
+        self.job_source_class = PollingJobSource
+        # Large sends are split into several Accsyn jobs, limited in number
+        # of tasks and JSON size, submitted in parallel.
+        self.max_tasks_per_job = 5000
+        self.max_job_bytes = 4 * 1024 * 1024
+        self.submit_workers = 4
+        # Replace directories with (almost) all files selected, image 
+        # sequences typically, with a single directory task. Coverage is
+        # the fraction of files beneath directory required to be selected,
+        # directories are listed with directory_lister on the raw path.
+        self.coalesce_directories = False
+        self.coalesce_coverage = 1.0
+        self.coalesce_min_files = 2
+        self.directory_lister = list_local_directory
+        # Root share rules for mapping raw paths to Accsyn, see PathMapper.
+        # Example:
+        #   [
+        #       {'prefix': '/mnt/projects', 'location': 'studio.disk'},
+        #       {'project': 'myproject', 'share': 'myproject_share'},
+        #   ]
+        self.path_rules = []
+        # Paths are resolved per location; joined directly from prefetched
+        # resource identifiers for these accessor types (None; ftrack 
+        # DiskAccessor), through other accessors on this many threads.
+        self.direct_path_accessors = None
+        self.path_resolve_workers = 8
+        # Delta sends; skip components present at destination whose source 
+        # file is unchanged since last sent, according to stats from
+        # stat_provider recorded in a manifest file.
+        self.delta_sends = False
+        self.stat_provider = LocalStatProvider()
+        self.send_manifest_path = os.path.join(os.path.expanduser('~'), 
+            '.accsyn', 'ftrack_send_manifest.json')
+        self._send_manifest = None
+        # Speeds of recent sends, for estimating transfer time of dry runs
+        # which also report this many of the largest directories.
+        self.throughput_history_path = os.path.join(os.path.expanduser('~'), 
+            '.accsyn', 'ftrack_send_throughput.json')
+        self.dry_run_directory_count = 10
+        self._throughput_history = None
+        # Directory where sends are journaled, unfinished sends are resumed
+        # from here on startup. None disables journaling.
+        self.journal_directory = os.path.join(os.path.expanduser('~'), 
+            '.accsyn', 'ftrack_send_journal')
+        # Progress is written to ftrack job at most this often (seconds),
+        # errors immediately. The full log of each send goes to a rotating
+        # file in log directory, named after ftrack job id. None disables.
+        self.job_update_interval = 5.0
+        self.log_directory = os.path.join(os.path.expanduser('~'), 
+            '.accsyn', 'ftrack_send_logs')
+        self.log_max_bytes = 10 * 1024 * 1024
+        self.log_backup_count = 3
+        # Time phases and steps of each send and count its ftrack/Accsyn API
+        # calls, logging a summary when done. Aggregates across sends are 
+        # written to metrics path if set; Prometheus text format (for a 
+        # node exporter textfile collector) if it ends with ".prom", JSON 
+        # otherwise.
+        self.instrument_sends = False
+        self.metrics_class = RunMetrics
+        self.metrics_path = None
+        self._metrics_registry = None
+        # Max number of sends harvesting/submitting at once and waiting for
+        # their turn, Accsyn jobs in flight are monitored from a shared loop.
+        self.max_concurrent_sends = 4
+        self.max_queued_sends = 32
+        self._scheduler = None
+        # Sessions kept warm between launches, health checked when idle for
+        # a while. The ftrack schema cache is kept on disk so a restarted 
+        # action host starts quickly, None stores it in the ftrack API 
+        # default location (FTRACK_API_SCHEMA_CACHE_PATH or temp dir).
+        self.ftrack_session_pool_size = 6
+        self.accsyn_session_pool_size = 6
+        self.session_health_check_interval = 300.0
+        self.ftrack_schema_cache_path = None
+        # Callables creating sessions for the pools, ftrack/Accsyn API 
+        # sessions if None. Benchmarks use these to inject stand-ins.
+        self.ftrack_session_factory = None
+        self.accsyn_session_factory = None
+        self._ftrack_session_pool = None
+        self._accsyn_session_pool = None
+        # Seconds locations are cached, cache is also invalidated by ftrack
+        # update events on locations.
+        self.location_cache_ttl = 300.0
+        self._location_cache = None
 
     def register(self):
         self.session.event_hub.subscribe(
@@ -69,6 +3127,74 @@ class AccsynSendAction():
                 self.launch
         )
 
+        self.session.event_hub.subscribe(
+                'topic=ftrack.update',
+                self.get_location_cache().handle_update_event
+        )
+
+        self.resume()
+
+    def resume(self):
+        '''Resume sends left unfinished by a previous action process, 
+        monitoring their Accsyn jobs and registering components at 
+        destination once done, without harvesting or transferring again.
+
+        A journal that cannot be resumed, being unreadable, incomplete or 
+        its ftrack job deleted, is set aside and the next one resumed.'''
+        if not self.journal_directory:
+            return
+        for (journal, data) in RunJournal.scan(self.journal_directory):
+            send_run = None
+            try:
+                if data is None:
+                    raise Exception('Journal could not be read!')
+                send_run = AccsynSendRun.from_journal(self, data)
+                self._resume(send_run, data)
+            except:
+                self.logger.warning('(AS) Could not resume send from journal'
+                    ' {}, setting it aside: {}'.format(journal.path, 
+                        traceback.format_exc()))
+                if send_run is not None:
+                    send_run.reporter.close()
+                    send_run._close_log()
+                try:
+                    journal.set_aside()
+                except:
+                    self.logger.warning('(AS) Could not set journal {} '
+                        'aside: {}'.format(journal.path, 
+                            traceback.format_exc()))
+
+    def _resume(self, send_run, data):
+        '''Resume *send_run* restored from journal *data*, monitoring its 
+        Accsyn jobs or failing it if nothing was submitted.'''
+        with send_run.sessions():
+            if send_run.session.get('Job', send_run.job_id) is None:
+                raise Exception('ftrack job {} no longer exists!'.format(
+                    send_run.job_id))
+        if data['phase'] in ['submitting', 'monitoring', 'finishing'] and \
+                send_run.accsyn_jobs:
+            self.logger.info('(AS) Resuming send (job: {}, phase: {}, '
+                'Accsyn job(s): {})'.format(data['job_id'], 
+                    data['phase'], ', '.join(send_run.accsyn_jobs)))
+            if data['phase'] == 'submitting':
+                # Interrupted while harvesting, only part of selection 
+                # was submitted
+                send_run.error('Accsyn send interrupted by action '
+                    'restart while submitting, only {} component(s)/'
+                    'file(s) will be sent, please launch again!'.format(
+                        send_run.component_count))
+                send_run.job_final_status = 'failed'
+            send_run.info('Resumed after action restart, monitoring '
+                '{} Accsyn job(s)..'.format(len(send_run.accsyn_jobs)))
+            self.get_scheduler().watch(send_run, 
+                list(send_run.accsyn_jobs.keys()))
+        else:
+            # Interrupted before anything was submitted
+            send_run.error('Accsyn send interrupted by action restart '
+                'before submit, please launch again!')
+            send_run.job_final_status = 'failed'
+            send_run.close()
+
     def discover(self, event):
         data = event['data']
 
@@ -106,17 +3232,32 @@ class AccsynSendAction():
 
             # Check user input
             source_location_name = values['source_location']
-            destination_location_name = values['destination_location']
-            
-            if (source_location_name == destination_location_name):
+            destination_location_names = parse_location_names(
+                values.get('destination_location'))
+
+            if len(destination_location_names) == 0:
+                return self.log_and_return(
+                    'No destination location selected!',False)
+
+            if (source_location_name in destination_location_names):
                 return self.log_and_return(
                     'Source and destination location are the same!',False)
 
-            # Run in separate thread so we do not lock up action subsystem
-            thread = threading.Thread(target=self.run, args=(event, selection))
-            thread.start()
+            # Run on scheduler so we do not lock up action subsystem
+            scheduler = self.get_scheduler()
+            if not scheduler.submit(AccsynSendRun(self, event, selection)):
+                return self.log_and_return(
+                    'Too many Accsyn sends queued ({}), please try again '
+                    'later!'.format(scheduler.max_queue),False)
+            self.logger.info('(AS) Launch; Scheduler: {}'.format(
+                scheduler.metrics()))
 
             #self.run(event, selection)
+            if values.get('dry_run'):
+                return self.log_and_return(
+                    'Dry run of {} entities(s) initiated, check ftrack job '
+                    'for size and estimated transfer time!'.format(
+                        len(selection)),True)
             return self.log_and_return(
                 'Component transfer of {} entities(s) initiated, check ftrack '
                 'job for progress!'.format(len(selection)),True)
@@ -147,36 +3288,18 @@ class AccsynSendAction():
                     'type': 'enumerator'
                 },
                 {
-                    'label': 'Destination location',
+                    'label': 'Destination location(s)',
                     'data': [],
                     'name': 'destination_location',
-                    'type': 'enumerator'
+                    'type': 'enumerator',
+                    'multi_select': True
                 },
             ]
 
-            # Featch all locations
-            for location in self.session.query('Location').all():
-                logging.info('Got location: {}({})'.format(
-                    location['name'], 
-                    location['id']))
-
-                if location['name'] in self.excluded_locations:
-                    # Remove source location as well as ftrack default ones.
-                    continue
-
-                widgets[-2]['data'].append(
-                    {
-                        'label': location['name'],
-                        'value': location['name']
-                    }
-                )
-
-                widgets[-1]['data'].append(
-                    {
-                        'label': location['name'],
-                        'value': location['name']
-                    }
-                )
+            # Fetch all locations, from cache
+            location_cache = self.get_location_cache()
+            widgets[-2]['data'] = location_cache.enumerator(self.session)
+            widgets[-1]['data'] = location_cache.enumerator(self.session)
 
             widgets.extend([
                 {
@@ -184,345 +3307,88 @@ class AccsynSendAction():
                     'name': 'additional_files',
                     'value': '',
                     'type': 'textarea'
+                },
+                {
+                    'label': 'Dry run (estimate size and transfer time, '
+                        'send nothing)',
+                    'name': 'dry_run',
+                    'value': False,
+                    'type': 'boolean'
                 }
             ])
 
             return {'items': widgets }
 
+    def get_ftrack_session_pool(self):
+        '''Return pool of ftrack sessions used by sends.'''
+        if self._ftrack_session_pool is None:
+            self._ftrack_session_pool = SessionPool(
+                self.ftrack_session_factory or (lambda: ftrack_api.Session(
+                    auto_connect_event_hub=False,
+                    schema_cache_path=self.ftrack_schema_cache_path)),
+                max_size=self.ftrack_session_pool_size,
+                reset=lambda session: session.reset(),
+                health_check=lambda session: session.call(
+                    [{'action': 'query_server_information'}]),
+                check_interval=self.session_health_check_interval,
+                close=lambda session: session.close())
+        return self._ftrack_session_pool
+
+    def get_accsyn_session_pool(self):
+        '''Return pool of Accsyn sessions used by sends.'''
+        if self._accsyn_session_pool is None:
+            self._accsyn_session_pool = SessionPool(
+                self.accsyn_session_factory or accsyn_api.Session,
+                max_size=self.accsyn_session_pool_size,
+                health_check=lambda session: session.find('Site'),
+                check_interval=self.session_health_check_interval)
+        return self._accsyn_session_pool
+
+    def get_send_manifest(self):
+        '''Return store of components sent, for delta sends.'''
+        if self._send_manifest is None:
+            self._send_manifest = SendManifestStore(self.send_manifest_path)
+        return self._send_manifest
+
+    def get_throughput_history(self):
+        '''Return speeds of recent sends, for dry run estimates.'''
+        if self._throughput_history is None:
+            self._throughput_history = ThroughputHistory(
+                self.throughput_history_path)
+        return self._throughput_history
+
+    def get_metrics_registry(self):
+        '''Return aggregates of instrumented sends.'''
+        if self._metrics_registry is None:
+            self._metrics_registry = MetricsRegistry(self.metrics_path)
+        return self._metrics_registry
+
+    def get_location_cache(self):
+        '''Return cache of locations, shared by launch form and sends.'''
+        if self._location_cache is None:
+            self._location_cache = LocationCache(
+                excluded=self.excluded_locations,
+                ttl=self.location_cache_ttl)
+        return self._location_cache
+
+    def get_scheduler(self):
+        '''Return scheduler running sends, created on first use.'''
+        if self._scheduler is None:
+            self._scheduler = SendScheduler(
+                lambda: self.job_source_class(
+                    (self.accsyn_session_factory or accsyn_api.Session)()),
+                max_workers=self.max_concurrent_sends,
+                max_queue=self.max_queued_sends,
+                min_interval=self.monitor_min_interval,
+                max_interval=self.monitor_max_interval,
+                report_interval=self.monitor_report_interval)
+        return self._scheduler
+
     def run(self, event, entities):
-        '''Run migration of *project_id* from *source_location* 
-        to *destination_location*.
+        '''Run send of components beneath *entities* from source to 
+        destination location given in *event* in current thread.
         '''
-        session = ftrack_api.Session(auto_connect_event_hub=False)
-        accsyn_session = accsyn_api.Session()
-
-        logger = logging.getLogger(
-            __name__ + '.' + self.__class__.__name__ + '.thread'
-        )
-        job = None
-        user = event['source']['user']
-
-        def info(s):
-            logger.info(s)
-            if job:
-                job['data'] = json.dumps({'description': s})
-                session.commit()
-            return s
-
-        def warning(s):
-            logger.warning(s)
-            if job:
-                job['data'] = json.dumps({'description': s})
-                session.commit()
-            return s
-
-        def web_message(s):
-            session.event_hub.publish(
-                ftrack_api.event.base.Event(
-                    topic='ftrack.action.trigger-user-interface',
-                    data=dict(
-                        type='message',
-                        success=False,
-                        message=(s)
-                    ),
-                    target='applicationId=ftrack.client.web and user.id={0}'
-                    .format(user['id'])
-                ),
-                on_error='ignore'
-            )
-
-        def error(s):
-            warning(s)
-            web_message('[ERROR] {}'.format(s))
-            return s
-
-        values = event['data']['values']
-
-        source_location_name = values['source_location']
-        destination_location_name = values['destination_location']
-            
-        info('Creating ftrack job..')
-
-        # Create a new running Job.     
-        job = session.create(
-            'Job',
-            {
-                'user': session.get('User', user['id']),
-                'status': 'running',
-                'data': json.dumps({
-                    'description': 'Initialising Accsyn send...'
-                    }
-                )
-            }
-        )
-        session.commit()
-
-        job_final_status = 'done'
-        component_count = 0
-        try:
-            info('Fetching locations..')
-
-            # Get the source location entity.
-            source_location = session.query(
-                'Location where name is "{}"'.format(source_location_name)
-            ).one()
-
-            assert (not source_location is None),('No such source location!')
-
-            # Get the destination location entity.
-            destination_location = session.query(
-                'Location where name is "{}"'.format(destination_location_name)
-            ).one()
-
-            assert (not destination_location is None),(
-                'No such destination location!')
-
-            info("Harvesting components..")
-
-            components_and_paths = []
-            all_components = []
-
-            project_id = None
-
-            for entity in entities:
-                # Collect all the components attached to the selected entity
-                if entity['entityType'] == 'show':
-                    all_components.extend(session.query(
-                        'Component where version.asset.parent.project_id is'
-                        ' "{}"'.format(
-                            entity['entityId']
-                        )
-                    ).all())
-                    project_id = entity['entityId']
-                elif entity['entityType'] == 'list':
-                    list_ = session.query(
-                        'List where id is "{0}"'.format(
-                            entity['entityId']
-                        )
-                    ).one()
-                    # Fetch components from each item in list
-                    for e in list_[
-                        'items' if 'items' in list_ else 
-                        'review_session_objects'
-                    ]:
-                         all_components.extend(session.query(
-                            'Component where version.asset.parent.id is "{0}" '
-                            'or version.asset.parent.parent.id is "{0}" '
-                            'or version.asset.parent.parent.parent.id is "{0}" '
-                            'or version.task.id is "{0}" '
-                            'or version.id is "{0}"'.format(
-                                e['id']
-                            )
-                        ).all())
-                else:
-                    # shot/assetbuild or sequence or episode or task
-                    # TODO: support deeper structures
-                    all_components.extend(session.query(
-                        'Component where version.asset.parent.id is "{0}" '
-                        'or version.asset.parent.parent.id is "{0}" '
-                        'or version.asset.parent.parent.parent.id is "{0}" '
-                        'or version.task.id is "{0}" or version.id is "{0}"'
-                        .format(
-                            entity['entityId']
-                        )
-                    ).all())
-
-            if len(all_components) == 0:
-                error('No components found!')
-                job_final_status = 'failed'
-                return
-
-            if project_id is None:
-                project_id = all_components[0]['version']['asset']['parent']\
-                ['project_id']
-            project = session.query('Project where id={0}'.format(
-                project_id
-            )).one()
-
-            info('Evaluating paths (project: {}), removing unsendable '
-                'components of {}...'.format(
-                    project['name'], len(all_components))
-                )
-
-            # Filter out components like web playables etc, evaulate paths
-            for component in all_components:
-                p = p_raw = None
-                for d in component['component_locations']:
-                    location = d['location']
-                    if location['name'] in self.excluded_locations:
-                        continue
-                    try:
-                        p_raw = location.get_filesystem_path(component)
-                    except:
-                        logging.warning('   {}@{}; {}'.format(
-                            component['name'], 
-                            location['name'], 
-                            traceback.format_exc()))
-                        continue
-                    if 0<len(p_raw or ''):
-                        break
-                if len(p_raw or '') == 0:
-                    logging.warning('   {}; Empty path!'.format(
-                        component['name']))
-                    continue
-
-                # Create an Accsyn path from ftrack path, modify your code here 
-                # to identify and select different root shares if needed.
-                # We are simply assuming project folders are named as ftrack 
-                # project code and resides directly beneath root path
-
-                idx = p_raw.lower().find(project['name'].lower())
-                if 0<=idx:
-                    p = p_raw[idx:]
-                else:
-                    logging.warning('   {}; Path "{}" could be evaluated, does '
-                        'not contain project code!'.format(
-                            component['name'], p)
-                    )
-                    continue
-
-                components_and_paths.append((component, p, p_raw))
-
-            if 0<len(values['additional_files'].strip()):
-                for p in values['additional_files'].split('\n'):
-                    if p and 0<len(p):
-                        idx = p.lower().find(project['name'].lower())
-                        if 0<=idx:
-                            components_and_paths.append((None, p[idx:], p))
-                        else:
-                            logging.warning('   Additional path "{}" could be '
-                                'evaluated, does not contain project code!'
-                                .format(p))
-
-            if len(components_and_paths) == 0:
-                error('[ERROR] No components/additional files left after '
-                    'extracting paths!')
-                job_final_status = 'failed'
-                return
-
-            info('Building Accsyn job out of {} component(s)/files(s)..'
-                .format(len(components_and_paths)))
-
-            accsyn_job_data = {
-                'code':'Transfer of {} components from {} to {}'.format(
-                    len(components_and_paths), 
-                    source_location['name'], 
-                    destination_location['name']),
-                'tasks':[],
-                'mirror_paths':True
-            }
-            
-            for (component, p, p_raw) in components_and_paths:
-                if component:
-                    logging.info('   Adding component "{}"({}), path: {} '
-                        '(raw: {})'.format(
-                            component['name'], component['id'], p, p_raw))
-                else:
-                    logging.info('   Adding additional file: {}'.format(p))
-                
-                source_party = ('site={}'.format(source_location_name)) if \
-                    source_location_name.find('@') == -1 else \
-                    source_location_name
-                
-                destination_party = ('site={}'.format(
-                    destination_location_name)) if \
-                    destination_location_name.find('@') == -1 else \
-                    destination_location_name
-
-                accsyn_job_data['tasks'].append({
-                    'source':'{}:{}'.format(source_party, p),
-                    'destination':'{}'.format(destination_party)
-                })
-                component_count += 1
-
-
-            info('Submitting job to Accsyn (JSON: {})..'.format(
-                accsyn_job_data))
-
-            j = accsyn_session.create('Job', accsyn_job_data)
-            
-            info('Submitted (id: {}), removing component from destination '
-                'location...'.format(j['id']))
-            for (component,p,p_raw) in components_and_paths:
-                if component:
-                    try:
-                        cl = session.query('ComponentLocation where '
-                            'component.id="{}" and location.id="{}"'.format(
-                                component['id'],
-                                destination_location['id'])).first()
-                        if cl:
-                            info('(Post)    Removing component {} from location'
-                                ' {}...'.format(component, 
-                                    destination_location_name))
-                            session.delete(cl)
-                        session.commit()
-                    except:
-                        warning(traceback.format_exc())
-
-            while True:
-                time.sleep(2)
-                job_data = accsyn_session.find_one(
-                    'Job WHERE id={}'.format(j['id']))
-                info('{}; {}, {} MB/s, {}%, etr: {}'.format(
-                    job_data['code'], 
-                    job_data['status'], 
-                    job_data['speed'], 
-                    job_data['progress'], 
-                    job_data.get('etr', '')))
-                if job_data['status'] in ['done','failed','aborted']:
-                    if job_data['status'] in ['done']:
-                        web_message(info('Accsyn job finished successfully!'))
-                    elif job_data['status'] in ['aborted']:
-                        web_message(info('[WARNING] Accsyn job were aborted.'))
-                    elif job_data['status'] in ['failed']:
-                        error('Accsyn job FAILED! Check Accsyn for clues!')
-                        job_final_status = 'failed'
-                    break
-
-            # Set job status as done now
-            if job_final_status == 'done':
-                info('(Post) Adding components to destination location: {}...'
-                    .format(destination_location_name))
-                for (component,p,p_raw) in components_and_paths:
-                    if component:
-                        try:
-                            cl = session.query('ComponentLocation where '
-                                'component.id={} and location.id={}'
-                                .format(
-                                    component['id'],
-                                    destination_location['id'])).first()
-                            if cl:
-                                info('(Post)    Removing component {} from '
-                                    'location {}...'.format(component, 
-                                        destination_location_name))
-                                session.delete(cl)
-                            session.create(
-                                'ComponentLocation', data=dict(
-                                    component=component,
-                                    location=destination_location,
-                                    resource_identifier=p_raw
-                                )
-                            )
-                            info('(Post)    Adding component {} to location {}'
-                                ' @ path {}.'.format(
-                                    component, 
-                                    destination_location_name, 
-                                    p_raw))
-                            session.commit()
-                        except:
-                            warning(traceback.format_exc())
-            info('(Post) Done...')
-
-        except Exception as e:
-            warning(traceback.format_exc())
-            error('Accsyn send CRASHED! Details: {}'.format(str(e)))
-            job_final_status = 'failed'
-        finally:
-            # This will notify the user in the web ui.
-            job['status'] = job_final_status
-            session.commit()
-
-        return component_count
+        return AccsynSendRun(self, event, entities).run()
 
 
 if __name__ == '__main__':
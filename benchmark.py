@@ -0,0 +1,635 @@
+# :coding: utf-8
+#
+# Accsyn send Action benchmarks
+#
+#   Offline benchmarks for the Accsyn send action, run with:
+#
+#       python benchmark.py [path_mapping] [send] [--paths 100000] 
+#           [--components 100,10000,100000] [--selection contexts] 
+#           [--depth 3] [--locations 2] [--latency 0] [--no-memory]
+#           [--no-direct-paths]
+#
+#   - path_mapping; Maps synthetic paths with the precompiled PathMapper
+#     and compares with the former per path project code search.
+#   - send; Runs sends end to end against in-process stand-ins for the
+#     ftrack and Accsyn APIs serving a synthetic show, reporting wall time,
+#     round trips and peak memory of each phase. No network is involved, 
+#     though ftrack and Accsyn API.s must be installed for action to import.
+#
+# Author: Henrik Norin, Accsyn/HDR AB, (c)2020
+#
+
+import argparse
+import collections
+import logging
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import action
+
+
+def generate_paths(count, project_names, seed=0):
+    '''Return *count* synthetic (raw path, location name) tuples, spread
+    over *project_names*, a few of them not containing any project.'''
+    rng = random.Random(seed)
+    paths = []
+    for idx in range(count):
+        if idx % 50 == 0:
+            # Unsendable, eg. a web playable in a temp dir
+            paths.append(('/tmp/ftrack/playable_{}.mp4'.format(idx),
+                'studio.disk'))
+            continue
+        project_name = rng.choice(project_names)
+        paths.append(('/mnt/projects/{}/seq{:03d}/sh{:04d}/render/v{:03d}/'
+            'beauty.{:04d}.exr'.format(project_name, rng.randint(1, 20),
+            rng.randint(1, 500), rng.randint(1, 10), idx % 1000),
+            'studio.disk'))
+    return paths
+
+
+def benchmark_path_mapping(count, repeat=5):
+    '''Benchmark mapping of *count* synthetic paths, best of *repeat* 
+    runs.'''
+
+    def best_of(f):
+        timings = []
+        for _ in range(repeat):
+            started = time.time()
+            result = f()
+            timings.append(time.time() - started)
+        return (min(timings), result)
+
+    # Former code path, a case insensitive search for the name of the one 
+    # project sent from, anywhere within path
+    def legacy_map(paths, project_name):
+        result = []
+        for (p_raw, location_name) in paths:
+            idx = p_raw.lower().find(project_name.lower())
+            result.append(p_raw[idx:] if 0<=idx else None)
+        return result
+
+    def path_mapper(paths, project_names, rules):
+        mapper = action.PathMapper(project_names, rules)
+        return best_of(lambda: mapper.map_paths(paths))
+
+    prefix_rules = [{'prefix': '/mnt/projects', 'location': 'studio.disk'}]
+    project_names = ['proj{}'.format(idx) for idx in range(10)]
+    paths = generate_paths(count, project_names[:1])
+    (legacy_elapsed, legacy_result) = best_of(
+        lambda: legacy_map(paths, project_names[0]))
+
+    print('Path mapping of {} path(s), 1 project:'.format(count))
+    print('   Project code search (former): {:.3f}s, {} mapped'.format(
+        legacy_elapsed, len(legacy_result) - legacy_result.count(None)))
+    for (label, rules) in [('no rules', []), ('prefix rule', prefix_rules)]:
+        (elapsed, result) = path_mapper(paths, project_names[:1], rules)
+        print('   PathMapper ({}): {:.3f}s, {} mapped ({:.2f}x former)'
+            .format(label, elapsed, len(result) - result.count(None), 
+                elapsed / (legacy_elapsed or 1e-9)))
+
+    # Not supported by the former code, for reference only
+    paths = generate_paths(count, project_names)
+    print('Path mapping of {} path(s), {} projects:'.format(count, 
+        len(project_names)))
+    for (label, rules) in [('no rules', []), ('prefix rule + share', 
+            prefix_rules + [{'project': project_names[-1], 
+            'share': 'archive'}])]:
+        (elapsed, result) = path_mapper(paths, project_names, rules)
+        print('   PathMapper ({}): {:.3f}s, {} mapped'.format(label, elapsed,
+            len(result) - result.count(None)))
+
+
+class FakeEntity(dict):
+    '''Stand-in for an ftrack entity, attributes held as items.'''
+
+    def __init__(self, entity_type, **data):
+        dict.__init__(self, **data)
+        self.entity_type = entity_type
+
+
+class FakeDiskAccessor(object):
+    '''Stand-in for an ftrack disk accessor, mounted at *prefix*.'''
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def get_filesystem_path(self, resource_identifier):
+        return os.path.join(self.prefix, resource_identifier)
+
+
+class FakeLocation(FakeEntity):
+    '''Stand-in for an ftrack location having a disk accessor.'''
+
+    def __init__(self, location_id, name, prefix):
+        FakeEntity.__init__(self, 'Location', id=location_id, name=name)
+        self.accessor = FakeDiskAccessor(prefix)
+
+    def get_filesystem_path(self, component):
+        for cl in component['component_locations']:
+            if cl['location'] is self:
+                return self.accessor.get_filesystem_path(
+                    cl['resource_identifier'])
+        raise Exception('Component {} not in location {}!'.format(
+            component['id'], self['name']))
+
+
+class FakeQueryResult(object):
+
+    def __init__(self, entities):
+        self.entities = entities
+
+    def all(self):
+        return list(self.entities)
+
+    def one(self):
+        if len(self.entities) != 1:
+            raise Exception('Expected exactly one result, got {}!'.format(
+                len(self.entities)))
+        return self.entities[0]
+
+    def first(self):
+        return self.entities[0] if self.entities else None
+
+
+class FakeEventHub(object):
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, event, on_error=None):
+        self.published.append(event)
+
+    def subscribe(self, subscription, callback):
+        pass
+
+
+class SyntheticShow(object):
+    '''In-memory ftrack project and Accsyn domain, the server side state 
+    shared by fake sessions.
+
+    Contexts are generated *depth* levels deep beneath the project, leaf 
+    contexts (tasks) holding *components_per_context* components, 
+    *components_per_version* per version, in *locations* locations each.
+    A list holds the first *list_size* versions, all if None. Each call 
+    making a round trip to a server is counted, and delayed by *latency* 
+    seconds. Accsyn jobs finish after *polls_to_finish* polls.
+    '''
+
+    SOURCE_LOCATION = 'studio.disk'
+    DESTINATION_LOCATION = 'vendor.disk'
+    # Locations beyond source, in order, components present in the first
+    # ones as configured.
+    OTHER_LOCATIONS = ['archive.disk', 'backup.disk', 'cloud.disk']
+    # Excluded by action, components are also present here
+    EXCLUDED_LOCATIONS = ['ftrack.server']
+
+    def __init__(self, components=100, depth=3, components_per_context=20,
+            components_per_version=4, locations=2, list_size=None, 
+            latency=0.0, polls_to_finish=4):
+        self.latency = latency
+        self.polls_to_finish = max(1, polls_to_finish)
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+        self.project = FakeEntity('Project', id='project-0', name='bench')
+        self.users = {}
+        self.jobs = {}
+        self.accsyn_jobs = {}
+
+        names = self.EXCLUDED_LOCATIONS + [self.SOURCE_LOCATION] + \
+            self.OTHER_LOCATIONS[:max(0, locations - 1)] + \
+            [self.DESTINATION_LOCATION]
+        self.locations = collections.OrderedDict((name, FakeLocation(
+            'location-{}'.format(idx), name, '/mnt/{}'.format(name))) 
+            for (idx, name) in enumerate(names))
+        component_location_names = [name for name in names 
+            if name != self.DESTINATION_LOCATION][:len(
+                self.EXCLUDED_LOCATIONS) + max(1, locations)]
+
+        # Context hierarchy, parent id => child contexts
+        self.children = collections.defaultdict(list)
+        leaf_count = max(1, int(math.ceil(components / 
+            float(components_per_context))))
+        fanout = max(1, int(math.ceil(leaf_count ** (1.0 / depth))))
+        level = [(self.project, '')]
+        for level_idx in range(depth):
+            count = leaf_count if level_idx == depth - 1 else \
+                min(leaf_count, fanout ** (level_idx + 1))
+            children = []
+            for idx in range(count):
+                (parent, path) = level[idx * len(level) // count]
+                context = FakeEntity('TypedContext', 
+                    id='context-{}-{:07d}'.format(level_idx, idx),
+                    parent_id=parent['id'], parent=parent)
+                self.children[parent['id']].append(context)
+                children.append((context, '{}/l{}_{:05d}'.format(path, 
+                    level_idx, idx)))
+            level = children
+        self.top_contexts = self.children[self.project['id']]
+
+        # Versions and components beneath leaf contexts
+        self.components = []
+        self.component_by_id = {}
+        self.by_context = collections.defaultdict(list)
+        self.by_task = collections.defaultdict(list)
+        self.by_version = collections.defaultdict(list)
+        self.versions = []
+        # (location id, component id) => ComponentLocations
+        self.component_locations = collections.defaultdict(list)
+        for (task, path) in level:
+            asset = FakeEntity('Asset', context_id=task['parent_id'], 
+                parent=FakeEntity('Context', id=task['parent_id'], 
+                    project_id=self.project['id']))
+            for idx in range(components_per_context):
+                if components <= len(self.components):
+                    break
+                if idx % components_per_version == 0:
+                    version = FakeEntity('AssetVersion', 
+                        id='version-{:07d}'.format(len(self.versions)),
+                        task_id=task['id'], asset=asset)
+                    self.versions.append(version)
+                component = FakeEntity('Component', 
+                    id='component-{:07d}'.format(len(self.components)),
+                    name='main', version_id=version['id'], version=version,
+                    component_locations=[])
+                self.component_by_id[component['id']] = component
+                resource_identifier = '{}{}/v{:03d}/frame.{:04d}.exr'.format(
+                    self.project['name'], path, 
+                    len(self.versions) % 1000, idx)
+                for name in component_location_names:
+                    self._add_component_location(FakeEntity(
+                        'ComponentLocation', id='cl-{}-{}'.format(name, 
+                            component['id']), 
+                        component_id=component['id'], 
+                        location_id=self.locations[name]['id'],
+                        resource_identifier=resource_identifier))
+                self.components.append(component)
+                self.by_context[asset['context_id']].append(component)
+                self.by_task[task['id']].append(component)
+                self.by_version[version['id']].append(component)
+        self.list = FakeEntity('List', id='list-0', 
+            items=self.versions[:list_size])
+
+    def _add_component_location(self, cl):
+        cl['location'] = next(location for location in 
+            self.locations.values() if location['id'] == cl['location_id'])
+        self.component_locations[(cl['location_id'], cl['component_id'])]\
+            .append(cl)
+        component = self.component_by_id.get(cl['component_id'])
+        if component is not None:
+            component['component_locations'].append(cl)
+
+    def _remove_component_location(self, cl):
+        self.component_locations[(cl['location_id'], cl['component_id'])]\
+            .remove(cl)
+        component = self.component_by_id.get(cl['component_id'])
+        if component is not None and cl in component['component_locations']:
+            component['component_locations'].remove(cl)
+
+    def round_trip(self, key):
+        '''Count a call to server as *key*, simulating latency.'''
+        with self._lock:
+            self.counters[key] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def round_trips(self):
+        with self._lock:
+            return sum(self.counters.values())
+
+    def selection(self, kind):
+        '''Return launch event and entities selecting all components 
+        through a selection of *kind*; show, contexts or list.'''
+        if kind == 'show':
+            entities = [{'entityType': 'show', 
+                'entityId': self.project['id']}]
+        elif kind == 'list':
+            entities = [{'entityType': 'list', 'entityId': self.list['id']}]
+        else:
+            entities = [{'entityType': 'sequence', 'entityId': context['id']}
+                for context in self.top_contexts]
+        event = {
+            'source': {'user': {'id': 'user-0'}},
+            'data': {'values': {
+                'source_location': self.SOURCE_LOCATION,
+                'destination_location': self.DESTINATION_LOCATION,
+                'additional_files': '',
+            }}
+        }
+        return (event, entities)
+
+    # ftrack server
+
+    IDS = re.compile(r'"([^"]*)"')
+
+    def _ids(self, expression, attribute):
+        match = re.search(r'{} in \(([^)]*)\)'.format(re.escape(attribute)),
+            expression)
+        return self.IDS.findall(match.group(1)) if match else []
+
+    def query(self, expression):
+        if ' from Location' in expression:
+            return list(self.locations.values())
+        elif ' from TypedContext' in expression:
+            return [context for _id in self._ids(expression, 'parent_id') 
+                for context in self.children.get(_id, [])]
+        elif ' from Component where' in expression:
+            if 'project_id is' in expression:
+                components = self.components
+            else:
+                by_id = {}
+                for (attribute, index) in [
+                    ('version.asset.context_id', self.by_context),
+                    ('version.task_id', self.by_task),
+                    ('version_id', self.by_version),
+                ]:
+                    for _id in self._ids(expression, attribute):
+                        for component in index.get(_id, []):
+                            by_id[component['id']] = component
+                components = [by_id[_id] for _id in sorted(by_id)]
+            match = re.search(r'offset (\d+) limit (\d+)', expression)
+            if match:
+                offset = int(match.group(1))
+                components = components[offset:offset + int(match.group(2))]
+            return components
+        elif ' from ComponentLocation' in expression:
+            location_id = re.search(r'location_id is "([^"]*)"', 
+                expression).group(1)
+            return [cl for _id in self._ids(expression, 'component_id') 
+                for cl in self.component_locations.get((location_id, _id),
+                    [])]
+        elif ' from Project' in expression:
+            return [self.project]
+        elif expression.startswith('List where'):
+            return [self.list]
+        raise Exception('Unsupported query: {}'.format(expression))
+
+    def get(self, entity_type, entity_id):
+        if entity_type == 'Job':
+            return self.jobs.get(entity_id)
+        return self.users.setdefault(entity_id, FakeEntity(entity_type, 
+            id=entity_id))
+
+    def apply(self, operations):
+        with self._lock:
+            for (operation, entity) in operations:
+                if operation == 'create' and entity.entity_type == 'Job':
+                    self.jobs[entity['id']] = entity
+                elif operation == 'create' and \
+                        entity.entity_type == 'ComponentLocation':
+                    self._add_component_location(entity)
+                elif operation == 'delete' and \
+                        entity.entity_type == 'ComponentLocation':
+                    self._remove_component_location(entity)
+
+    # Accsyn server
+
+    def create_accsyn_job(self, data):
+        with self._lock:
+            job_id = 'accsyn-job-{}'.format(len(self.accsyn_jobs))
+            self.accsyn_jobs[job_id] = {
+                'id': job_id,
+                'code': data['code'],
+                'status': 'running',
+                'progress': 0,
+                'speed': 100.0,
+                'etr': '',
+                'tasks': len(data['tasks']),
+            }
+        return {'id': job_id}
+
+    def poll_accsyn_job(self, job_id):
+        with self._lock:
+            job_data = self.accsyn_jobs[job_id]
+            job_data['progress'] = min(100, job_data['progress'] + 
+                int(math.ceil(100.0 / self.polls_to_finish)))
+            if job_data['progress'] == 100:
+                job_data['status'] = 'done'
+            return dict(job_data)
+
+
+class FakeFtrackSession(object):
+    '''In-process stand-in for ftrack_api.Session, serving *show*.'''
+
+    def __init__(self, show):
+        self.show = show
+        self.event_hub = FakeEventHub()
+        self._operations = []
+        self._created = 0
+
+    def query(self, expression):
+        self.show.round_trip('ftrack.query')
+        return FakeQueryResult(self.show.query(expression))
+
+    def get(self, entity_type, entity_id):
+        self.show.round_trip('ftrack.get')
+        return self.show.get(entity_type, entity_id)
+
+    def create(self, entity_type, data):
+        entity = FakeEntity(entity_type, **data)
+        if not 'id' in entity:
+            self._created += 1
+            entity['id'] = '{}-{}-{}'.format(entity_type.lower(), id(self),
+                self._created)
+        self._operations.append(('create', entity))
+        return entity
+
+    def delete(self, entity):
+        self._operations.append(('delete', entity))
+
+    def commit(self):
+        self.show.round_trip('ftrack.commit')
+        (operations, self._operations) = (self._operations, [])
+        self.show.apply(operations)
+
+    def rollback(self):
+        self._operations = []
+
+    def reset(self):
+        self._operations = []
+
+    def populate(self, entities, projections):
+        self.show.round_trip('ftrack.populate')
+
+    def call(self, operations):
+        self.show.round_trip('ftrack.call')
+        return [{} for operation in operations]
+
+    def close(self):
+        pass
+
+
+class FakeAccsynSession(object):
+    '''In-process stand-in for accsyn_api.Session, serving *show*.'''
+
+    def __init__(self, show):
+        self.show = show
+
+    def create(self, entity_type, data):
+        self.show.round_trip('accsyn.create')
+        return self.show.create_accsyn_job(data)
+
+    def find(self, query):
+        self.show.round_trip('accsyn.find')
+        if query.startswith('Site'):
+            return [{'id': 'site-0'}]
+        return [self.show.poll_accsyn_job(job_id.strip()) for job_id in 
+            query[query.index('(') + 1:query.rindex(')')].split(',')]
+
+    def find_one(self, query):
+        self.show.round_trip('accsyn.find_one')
+        return self.show.poll_accsyn_job(query.split('=', 1)[1].strip())
+
+
+class PhaseMetrics(action.RunMetrics):
+    '''Run metrics also recording round trips to *show* and, if traced, 
+    peak memory allocated during each phase.'''
+
+    def __init__(self, show):
+        action.RunMetrics.__init__(self)
+        self.show = show
+        self.round_trips = collections.Counter()
+        self.peak_memory = {}
+        self._round_trips_at = 0
+
+    def enter(self, phase):
+        ended = self._phase
+        round_trips = self.show.round_trips()
+        if ended is not None:
+            self.round_trips[ended] += round_trips - self._round_trips_at
+            if tracemalloc.is_tracing():
+                self.peak_memory[ended] = max(self.peak_memory.get(ended, 0),
+                    tracemalloc.get_traced_memory()[1])
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+        self._round_trips_at = round_trips
+        action.RunMetrics.enter(self, phase)
+
+
+def create_send_action(show, directory, direct_paths=True):
+    '''Return send action served by *show* through fake sessions, keeping
+    its journal, manifest and history files in *directory*.'''
+    send_action = action.AccsynSendAction(session=FakeFtrackSession(show))
+    send_action.ftrack_session_factory = lambda: FakeFtrackSession(show)
+    send_action.accsyn_session_factory = lambda: FakeAccsynSession(show)
+    if direct_paths:
+        # Join paths from prefetched resource identifiers, as for ftrack
+        # disk accessors, otherwise accessor is called on a thread pool.
+        send_action.direct_path_accessors = [FakeDiskAccessor]
+    send_action.monitor_min_interval = 0.01
+    send_action.monitor_max_interval = 0.05
+    send_action.journal_directory = os.path.join(directory, 'journal')
+    send_action.log_directory = None
+    send_action.send_manifest_path = os.path.join(directory, 'manifest.json')
+    send_action.throughput_history_path = os.path.join(directory, 
+        'throughput.json')
+    return send_action
+
+
+def benchmark_send(count, selection='contexts', depth=3, locations=2, 
+        latency=0.0, trace_memory=True, direct_paths=True, list_size=None):
+    '''Benchmark a send of *count* synthetic components end to end, a list 
+    selection holding *list_size* versions (all if None).'''
+    started = time.time()
+    show = SyntheticShow(components=count, depth=depth, locations=locations,
+        list_size=list_size, latency=latency)
+    generated = time.time() - started
+
+    directory = tempfile.mkdtemp(prefix='accsyn_send_benchmark_')
+    metrics = []
+
+    def create_metrics():
+        metrics.append(PhaseMetrics(show))
+        return metrics[-1]
+
+    try:
+        send_action = create_send_action(show, directory, 
+            direct_paths=direct_paths)
+        send_action.instrument_sends = True
+        send_action.metrics_class = create_metrics
+
+        (event, entities) = show.selection(selection)
+        if trace_memory:
+            tracemalloc.start()
+        started = time.time()
+        sent = send_action.run(event, entities)
+        elapsed = time.time() - started
+        if trace_memory:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    run_metrics = metrics[-1]
+    print('Send of {} component(s), {} selection{}, depth {}, {} '
+        'location(s), {:.0f}ms latency (show generated in {:.2f}s):'.format(
+            count, selection, ' of {} version(s)'.format(len(
+                show.list['items'])) if selection == 'list' else '', 
+            depth, locations, latency * 1000, generated))
+    print('   Total: {:.3f}s, {} component(s) sent in {} Accsyn job(s), {} '
+        'round trip(s)'.format(elapsed, sent, len(show.accsyn_jobs), 
+            sum(show.counters.values())))
+    print('   Round trips: {}'.format(', '.join('{} x{}'.format(key, value) 
+        for (key, value) in sorted(show.counters.items()))))
+    print('   {:<12} {:>10} {:>12} {:>12}'.format('Phase', 'Wall (s)', 
+        'Round trips', 'Peak (MB)'))
+    for (phase, seconds) in run_metrics.phases.items():
+        peak = run_metrics.peak_memory.get(phase)
+        print('   {:<12} {:>10.3f} {:>12} {:>12}'.format(phase, seconds, 
+            run_metrics.round_trips[phase], 
+            '{:.1f}'.format(peak / 1024.0 / 1024.0) if peak is not None 
+                else '-'))
+    print('   Steps: {}'.format(', '.join('{} {:.3f}s'.format(name, seconds)
+        for (name, seconds) in run_metrics.timings.items())))
+
+
+BENCHMARKS = {
+    'path_mapping': lambda args: benchmark_path_mapping(args.paths),
+    'send': lambda args: [benchmark_send(count, selection=args.selection,
+        depth=args.depth, locations=args.locations, 
+        latency=args.latency / 1000.0, trace_memory=not args.no_memory,
+        direct_paths=not args.no_direct_paths, list_size=args.list_size) 
+        for count in args.components],
+}
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser(description='Accsyn send benchmarks.')
+    parser.add_argument('benchmarks', nargs='*', default=sorted(BENCHMARKS),
+        help='Benchmarks to run: {}.'.format(', '.join(sorted(BENCHMARKS))))
+    parser.add_argument('--paths', type=int, default=100000,
+        help='Number of synthetic paths to map.')
+    parser.add_argument('--components', default='100,10000,100000',
+        type=lambda s: [int(count) for count in s.split(',')],
+        help='Comma separated number of components to send, one send each.')
+    parser.add_argument('--selection', default='contexts', 
+        choices=['contexts', 'show', 'list'],
+        help='How components are selected.')
+    parser.add_argument('--list-size', type=int, default=None,
+        help='Number of versions in list selected, all if omitted.')
+    parser.add_argument('--depth', type=int, default=3,
+        help='Levels of contexts beneath project.')
+    parser.add_argument('--locations', type=int, default=2,
+        help='Number of locations each component is present in.')
+    parser.add_argument('--latency', type=float, default=0.0,
+        help='Simulated latency of each ftrack/Accsyn call, milliseconds.')
+    parser.add_argument('--no-memory', action='store_true',
+        help='Do not trace memory, tracing slows down sends.')
+    parser.add_argument('--no-direct-paths', action='store_true',
+        help='Resolve paths through accessor instead of joining them from '
+        'resource identifiers.')
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if not name in BENCHMARKS:
+            parser.error('Unknown benchmark: {}'.format(name))
+
+    for name in args.benchmarks:
+        BENCHMARKS[name](args)
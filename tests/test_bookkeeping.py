@@ -0,0 +1,90 @@
+import logging
+
+import action
+
+
+class FakeQuery(object):
+
+    def __init__(self, result):
+        self.result = result
+
+    def all(self):
+        return list(self.result)
+
+
+class FakeSession(object):
+    '''ftrack session holding entities per type in memory, with commits
+    failing for components in *failing*.'''
+
+    def __init__(self, entities=None, failing=None):
+        self.entities = entities or {}
+        self.failing = set(failing or [])
+        self.queries = []
+        self.commits = 0
+        self.committed = []
+        self._operations = []
+
+    def query(self, expression):
+        self.queries.append(expression)
+        entity_type = expression.split(' from ')[1].split(' ')[0]
+        return FakeQuery(self.entities.get(entity_type, []))
+
+    def create(self, entity_type, data):
+        self._operations.append(('create', data))
+
+    def delete(self, entity):
+        self._operations.append(('delete', entity))
+
+    def commit(self):
+        for (operation, data) in self._operations:
+            if data['component_id'] in self.failing:
+                raise Exception('Cannot commit {}'.format(data))
+        self.commits += 1
+        self.committed.extend(self._operations)
+        self._operations = []
+
+    def rollback(self):
+        self._operations = []
+
+
+LOCATION = {'id': 'loc', 'name': 'studio.remote'}
+
+
+def test_bookkeeper_retries_failed_batch_one_by_one():
+    session = FakeSession(failing=['c2'])
+    bookkeeper = action.ComponentLocationBookkeeper(session, LOCATION,
+        logging.getLogger(__name__), commit_batch_size=10)
+    added = bookkeeper.add([('c1', 'a.exr'), ('c2', 'b.exr'),
+        ('c3', 'c.exr')])
+    assert added == 2
+    assert bookkeeper.failed == 1
+    assert session.commits == 2
+    # Failed batch commit, then one commit per component
+    assert bookkeeper.commit_count == 4
+
+
+def test_bookkeeper_chunks_queries_and_removes_existing():
+    existing = [{'id': 'cl{}'.format(idx), 'component_id': 'c{}'.format(
+        idx), 'location_id': 'loc'} for idx in range(3)]
+    session = FakeSession({'ComponentLocation': existing})
+    bookkeeper = action.ComponentLocationBookkeeper(session, LOCATION,
+        logging.getLogger(__name__), chunk_size=2, commit_batch_size=2)
+    assert bookkeeper.remove(['c0', 'c1', 'c2', 'c3']) == 3
+    assert bookkeeper.query_count == 2
+    assert session.commits == 2
+
+
+def test_bookkeeper_replaces_existing_component_locations():
+    existing = {'id': 'cl0', 'component_id': 'c0', 'location_id': 'loc'}
+    session = FakeSession({'ComponentLocation': [existing]})
+    bookkeeper = action.ComponentLocationBookkeeper(session, LOCATION,
+        logging.getLogger(__name__))
+    assert bookkeeper.add([('c0', 'a.exr'), ('c1', 'b.exr')]) == 2
+    assert session.committed == [
+        ('delete', existing),
+        ('create', {'component_id': 'c0', 'location_id': 'loc',
+            'resource_identifier': 'a.exr'}),
+        ('create', {'component_id': 'c1', 'location_id': 'loc',
+            'resource_identifier': 'b.exr'}),
+    ]
+    assert (bookkeeper.query_count, bookkeeper.commit_count) == (1, 1)
@@ -0,0 +1,92 @@
+import benchmark
+
+import action
+
+
+class FakeStatProvider(object):
+    '''Stat provider serving (size, mtime, checksum) of files in *files*,
+    raw path => stat, recording paths stat:ed.'''
+
+    def __init__(self, files=None):
+        self.files = files or {}
+        self.stated = []
+
+    def stat(self, location_name, paths):
+        self.stated.extend(paths)
+        return dict((path, self.files.get(path, (1024, 0, None))) for path
+            in paths)
+
+
+class AbortingShow(benchmark.SyntheticShow):
+    '''Show whose Accsyn jobs in *aborted* are aborted when polled.'''
+
+    aborted = ()
+
+    def poll_accsyn_job(self, job_id):
+        job_data = benchmark.SyntheticShow.poll_accsyn_job(self, job_id)
+        if job_id in self.aborted:
+            job_data['status'] = self.accsyn_jobs[job_id]['status'] = \
+                'aborted'
+        return job_data
+
+
+def create_delta_action(show, directory):
+    send_action = benchmark.create_send_action(show, directory)
+    send_action.delta_sends = True
+    send_action.stat_provider = FakeStatProvider()
+    return send_action
+
+
+def test_unchanged_components_are_skipped(tmp_path):
+    show = benchmark.SyntheticShow(components=8)
+    send_action = create_delta_action(show, str(tmp_path))
+    destination_id = show.locations[show.DESTINATION_LOCATION]['id']
+
+    assert send_action.run(*show.selection('show')) == 8
+    manifest = send_action.get_send_manifest()
+    assert all(manifest.get(component['id'], destination_id) == (1024, 0,
+        None) for component in show.components)
+    jobs_sent = len(show.accsyn_jobs)
+
+    # Only the component whose source file changed is sent again
+    changed = show.components[3]
+    p_raw = show.locations[show.SOURCE_LOCATION].get_filesystem_path(
+        changed)
+    send_action.stat_provider.files[p_raw] = (2048, 10, None)
+    del send_action.stat_provider.stated[:]
+    assert send_action.run(*show.selection('show')) == 1
+    assert len(send_action.stat_provider.stated) == 8
+    assert len(show.accsyn_jobs) == jobs_sent + 1
+    assert manifest.get(changed['id'], destination_id) == (2048, 10, None)
+
+
+def test_components_of_aborted_jobs_are_not_recorded(tmp_path):
+    show = AbortingShow(components=8)
+    show.aborted = ('accsyn-job-0',)
+    send_action = create_delta_action(show, str(tmp_path))
+    send_action.max_tasks_per_job = 4
+    destination_id = show.locations[show.DESTINATION_LOCATION]['id']
+
+    assert send_action.run(*show.selection('show')) == 8
+
+    assert len(show.accsyn_jobs) == 2
+    recorded = [component['id'] for component in show.components if
+        send_action.get_send_manifest().get(component['id'], destination_id)]
+    assert len(recorded) == 4
+    # Sent again next time, as not known to be up to date at destination
+    assert send_action.run(*show.selection('show')) == 4
+
+
+def test_send_finishes_when_manifest_cannot_be_written(tmp_path):
+    show = benchmark.SyntheticShow(components=8)
+    send_action = create_delta_action(show, str(tmp_path))
+    # Directory of manifest is a file
+    (tmp_path / 'file').write_text(u'')
+    send_action.send_manifest_path = str(tmp_path / 'file' / 'manifest.json')
+    destination_id = show.locations[show.DESTINATION_LOCATION]['id']
+
+    assert send_action.run(*show.selection('show')) == 8
+
+    assert all(show.component_locations[(destination_id, component['id'])]
+        for component in show.components)
+    assert list(show.jobs.values())[0]['status'] == 'done'
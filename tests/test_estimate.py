@@ -0,0 +1,61 @@
+import json
+
+import benchmark
+
+import action
+
+MB = 1024 * 1024
+
+
+class FakeStatProvider(object):
+    '''Stat provider sizing each file 1 MB, except *missing* ones.'''
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+
+    def stat(self, location_name, paths):
+        return dict((path, None if path in self.missing else (MB, 0, None))
+            for path in paths)
+
+
+def test_send_estimate_partial():
+    estimate = action.SendEstimate()
+    records = [action.ComponentRecord('c1', 'main', 'p/a.exr', '/a'),
+        action.ComponentRecord('c2', 'main', 'p/b.exr', '/b')]
+    estimate.add(records, {'/a': (MB, 0, None), '/b': None})
+    assert estimate.partial
+    assert estimate.size == MB
+    assert estimate.largest_directories() == [('p', MB)]
+    assert estimate.eta(1.0) == 1.0
+    assert estimate.eta(None) is None
+    empty = action.SendEstimate()
+    empty.add(records, {})
+    assert empty.eta(1.0) is None
+
+
+def test_dry_run_estimates_without_sending(tmp_path):
+    show = benchmark.SyntheticShow(components=8)
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    source = show.locations[show.SOURCE_LOCATION]
+    send_action.stat_provider = FakeStatProvider([source.get_filesystem_path(
+        show.components[0])])
+    send_action.get_throughput_history().add(7.0)
+    (event, entities) = show.selection('show')
+    event['data']['values']['dry_run'] = True
+    destination_id = show.locations[show.DESTINATION_LOCATION]['id']
+    existing = dict((component['id'], list(show.component_locations[
+        (destination_id, component['id'])])) for component in
+        show.components)
+
+    assert send_action.run(event, entities) == 8
+
+    assert not show.accsyn_jobs
+    assert existing == dict((component['id'], show.component_locations[
+        (destination_id, component['id'])]) for component in show.components)
+    job = list(show.jobs.values())[0]
+    assert job['status'] == 'done'
+    data = json.loads(job['data'])
+    assert (data['files'], data['bytes'], data['missing']) == (7, 7 * MB, 1)
+    assert data['partial']
+    assert data['speed'] == 7.0
+    assert data['eta'] == '00:00:01'
@@ -0,0 +1,166 @@
+import threading
+
+import benchmark
+
+import action
+
+
+class RecordingSession(benchmark.FakeFtrackSession):
+    '''Fake ftrack session recording queries made.'''
+
+    def __init__(self, show):
+        benchmark.FakeFtrackSession.__init__(self, show)
+        self.queries = []
+
+    def query(self, expression):
+        self.queries.append(expression)
+        return benchmark.FakeFtrackSession.query(self, expression)
+
+
+def component_ids(components):
+    return sorted(component['id'] for component in components)
+
+
+def test_list_selection_is_resolved_in_chunked_queries():
+    show = benchmark.SyntheticShow(components=100, components_per_version=4)
+    session = RecordingSession(show)
+    harvester = action.ComponentHarvester(session, chunk_size=10)
+
+    components = harvester.harvest(show.selection('list')[1])
+
+    assert component_ids(components) == component_ids(show.components)
+    # One query for the list, one per chunk of 10 of its 25 versions
+    assert harvester.query_count == len(session.queries) == 4
+    assert harvester.count == 100
+
+
+def test_components_are_harvested_once_across_entities():
+    show = benchmark.SyntheticShow(components=40, components_per_version=4,
+        list_size=5)
+    harvester = action.ComponentHarvester(RecordingSession(show))
+    entities = show.selection('list')[1] + [
+        {'entityType': 'assetversion', 'entityId': show.versions[0]['id']},
+        {'entityType': 'assetversion', 'entityId': show.versions[9]['id']},
+    ]
+
+    components = harvester.harvest(entities)
+
+    assert component_ids(components) == component_ids(
+        component for version in show.versions[:5] + show.versions[9:10]
+        for component in show.by_version[version['id']])
+
+
+def test_component_queries_prefetch_projections():
+    show = benchmark.SyntheticShow(components=20)
+    session = RecordingSession(show)
+    action.ComponentHarvester(session).harvest(show.selection('show')[1])
+    assert session.queries == ['select {} from Component where '
+        'version.asset.parent.project_id is "{}"'.format(
+            ', '.join(action.ComponentHarvester.PROJECTIONS),
+            show.project['id'])]
+
+
+def test_lazy_loads_are_counted_on_sessions_installed():
+    show = benchmark.SyntheticShow(components=4)
+    (first, second) = (benchmark.FakeFtrackSession(show),
+        benchmark.FakeFtrackSession(show))
+    counter = action.LazyLoadCounter()
+    counter.install(first)
+    counter.install(second)
+    first.populate([], 'name')
+    second.populate([], 'name')
+    counter.uninstall(first)
+    first.populate([], 'version')
+    second.populate([], 'version')
+    counter.uninstall(second)
+
+    assert counter.count == 3
+    assert counter.attributes == {'name': 2, 'version': 1}
+    assert show.counters['ftrack.populate'] == 4
+    assert not 'populate' in first.__dict__
+    assert not 'populate' in second.__dict__
+
+
+def test_lazy_load_counting_is_removed_from_each_stage_session(tmp_path):
+    show = benchmark.SyntheticShow(components=4)
+    sessions = []
+
+    def create_session():
+        sessions.append(benchmark.FakeFtrackSession(show))
+        return sessions[-1]
+
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    send_action.ftrack_session_factory = create_session
+    send_run = action.AccsynSendRun(send_action, *show.selection('show'))
+    send_run.lazy_loads = action.LazyLoadCounter()
+    (entered, leave) = (threading.Event(), threading.Event())
+
+    def stage():
+        with send_run.sessions():
+            entered.set()
+            leave.wait(10)
+
+    thread = threading.Thread(target=stage)
+    thread.start()
+    assert entered.wait(10)
+    # Another thread, a timer or the monitor, runs a stage of its own
+    with send_run.sessions():
+        pass
+    leave.set()
+    thread.join(10)
+
+    assert len(sessions) == 2
+    assert not any('populate' in session.__dict__ for session in sessions)
+
+
+def test_contexts_are_expanded_level_by_level():
+    show = benchmark.SyntheticShow(components=200, depth=4,
+        components_per_context=5)
+    session = RecordingSession(show)
+    harvester = action.ComponentHarvester(session, chunk_size=1000)
+
+    components = harvester.harvest(show.selection('contexts')[1])
+
+    assert component_ids(components) == component_ids(show.components)
+    # One query per level, the leaf level finding no children, then one
+    # query for components beneath all contexts
+    assert harvester.levels == 4
+    assert [query.split(' from ')[1].split(' ')[0] for query in
+        session.queries] == ['TypedContext'] * 4 + ['Component']
+
+
+def test_context_queries_are_chunked_per_level():
+    show = benchmark.SyntheticShow(components=200, depth=2,
+        components_per_context=5)
+    session = RecordingSession(show)
+    harvester = action.ComponentHarvester(session, chunk_size=8)
+    # 40 leaf contexts beneath 7 top contexts
+    top_ids = [context['id'] for context in show.top_contexts]
+
+    context_ids = harvester.expand_contexts(top_ids)
+
+    assert len(context_ids) == len(top_ids) + 40
+    assert context_ids[:len(top_ids)] == top_ids
+    assert harvester.levels == 2
+    assert harvester.query_count == 1 + 5
+
+
+def test_overlapping_context_selections_are_expanded_once():
+    show = benchmark.SyntheticShow(components=40, depth=2,
+        components_per_context=5)
+    session = RecordingSession(show)
+    harvester = action.ComponentHarvester(session)
+    top = show.top_contexts[0]
+    child = show.children[top['id']][0]
+    entities = [{'entityType': 'sequence', 'entityId': top['id']},
+        {'entityType': 'shot', 'entityId': child['id']},
+        {'entityType': 'sequence', 'entityId': top['id']}]
+
+    context_ids = harvester.expand_contexts([entity['entityId'] for entity
+        in entities])
+    components = action.ComponentHarvester(session).harvest(entities)
+
+    assert sorted(context_ids) == sorted([top['id']] + [context['id']
+        for context in show.children[top['id']]])
+    assert len(components) == len(set(component_ids(components))) == \
+        5 * len(show.children[top['id']])
@@ -0,0 +1,81 @@
+import json
+import os
+import time
+
+import benchmark
+
+import action
+
+
+def wait_until(condition, timeout=10.0):
+    started = time.time()
+    while not condition():
+        assert time.time() - started < timeout
+        time.sleep(0.01)
+
+
+def interrupted_send(show, directory):
+    '''Submit a send of all components in *show*, leaving it journaled as
+    if the action process stopped while monitoring. Return its ftrack job
+    id.'''
+    send_run = action.AccsynSendRun(
+        benchmark.create_send_action(show, directory),
+        *show.selection('show'))
+    send_run.start()
+    assert send_run.prepare()
+    send_run.write_journal('monitoring')
+    send_run.reporter.close()
+    return send_run.job_id
+
+
+def journal_files(directory):
+    return sorted(os.listdir(os.path.join(directory, 'journal')))
+
+
+def test_resumed_send_registers_components_at_destination(tmp_path):
+    show = benchmark.SyntheticShow(components=8)
+    job_id = interrupted_send(show, str(tmp_path))
+    destination_id = show.locations[show.DESTINATION_LOCATION]['id']
+    assert not any(show.component_locations[(destination_id,
+        component['id'])] for component in show.components)
+
+    # Action restarted
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    send_action.register()
+
+    wait_until(lambda: show.jobs[job_id]['status'] == 'done')
+    assert all(show.component_locations[(destination_id, component['id'])]
+        for component in show.components)
+    wait_until(lambda: not journal_files(str(tmp_path)))
+
+
+def test_journals_that_cannot_be_resumed_are_set_aside(tmp_path):
+    show = benchmark.SyntheticShow(components=8)
+    directory = str(tmp_path)
+    (deleted, incomplete, resumed) = [interrupted_send(show, directory)
+        for _ in range(3)]
+    # The ftrack job of one send was deleted, the journal of another one
+    # lacks a key and a third journal is truncated
+    del show.jobs[deleted]
+    path = os.path.join(directory, 'journal', '{}.json'.format(incomplete))
+    with open(path, 'r') as f:
+        data = json.load(f)
+    del data['accsyn_jobs']
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    with open(os.path.join(directory, 'journal', 'truncated.json'),
+            'w') as f:
+        f.write('{"phase": "monit')
+
+    send_action = benchmark.create_send_action(show, directory)
+    send_action.register()
+
+    wait_until(lambda: show.jobs[resumed]['status'] == 'done')
+    wait_until(lambda: journal_files(directory) == sorted([
+        '{}.json.failed'.format(deleted),
+        '{}.manifest.jsonl.failed'.format(deleted),
+        '{}.json.failed'.format(incomplete),
+        '{}.manifest.jsonl.failed'.format(incomplete),
+        'truncated.json.failed',
+    ]))
+    assert show.jobs[incomplete]['status'] == 'running'
@@ -0,0 +1,60 @@
+import action
+
+
+def records(start, end):
+    return [action.ComponentRecord('c{}'.format(idx), 'main',
+        'p/{}.exr'.format(idx), '/mnt/p/{}.exr'.format(idx), 'loc',
+        [idx, 0, None] if idx % 2 else None) for idx in range(start, end)]
+
+
+def as_lists(records):
+    return [record.to_list() for record in records]
+
+
+def test_manifest_in_memory():
+    manifest = action.ComponentManifest()
+    assert manifest.add(records(0, 3)) == (0, 3)
+    assert manifest.add([]) == (3, 3)
+    assert manifest.add(records(3, 5)) == (3, 5)
+    assert len(manifest) == 5
+    assert as_lists(manifest.get(2, 4)) == as_lists(records(2, 4))
+
+
+def test_manifest_reads_ranges_back_from_file(tmp_path):
+    path = str(tmp_path / 'journal' / 'manifest.jsonl')
+    manifest = action.ComponentManifest(path)
+    ranges = [manifest.add(records(start, start + 3)) for start in
+        range(0, 30, 3)]
+
+    assert ranges[2] == (6, 9)
+    assert not manifest.records
+    assert as_lists(manifest.get(*ranges[2])) == as_lists(records(6, 9))
+    # Ranges not added at once, spanning several additions
+    assert as_lists(manifest.get(4, 11)) == as_lists(records(4, 11))
+    assert manifest.get(29, 40)[0].stat == [29, 0, None]
+    assert manifest.get(5, 5) == []
+
+
+def test_manifest_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(action.ComponentManifest, 'INDEX_INTERVAL', 4)
+    path = str(tmp_path / 'manifest.jsonl')
+    manifest = action.ComponentManifest(path)
+    manifest.add(records(0, 10))
+
+    loaded = action.ComponentManifest.load(path)
+    assert len(loaded) == 10
+    assert loaded._indices == [0, 4, 8]
+    assert as_lists(loaded.get(5, 10)) == as_lists(records(5, 10))
+    assert loaded.add(records(10, 12)) == (10, 12)
+    assert as_lists(loaded.get(9, 12)) == as_lists(records(9, 12))
+
+    loaded.remove()
+    assert len(action.ComponentManifest.load(path)) == 0
+
+
+def test_records_of_former_format_are_loaded(tmp_path):
+    path = tmp_path / 'manifest.jsonl'
+    path.write_text(u'["c1", "main", "p/a.exr", "/mnt/p/a.exr", "loc"]\n')
+    (record,) = action.ComponentManifest.load(str(path)).get(0, 1)
+    assert (record.id, record.location_id, record.stat) == ('c1', 'loc',
+        None)
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+import benchmark
+
+import action
+
+
+def test_run_metrics_time_phases_and_count_calls(clock):
+    show = benchmark.SyntheticShow(components=4)
+    session = benchmark.FakeFtrackSession(show)
+    metrics = action.RunMetrics(clock=clock)
+
+    metrics.enter('harvest')
+    metrics.instrument(session, 'ftrack', action.RunMetrics.FTRACK_METHODS)
+    session.query('select id from Location')
+    session.query('select id from Location')
+    clock.sleep(2)
+    with metrics.timed('path_evaluation'):
+        clock.sleep(1)
+    metrics.enter('submit')
+    clock.sleep(1)
+    metrics.enter(None)
+    action.RunMetrics.release(session, action.RunMetrics.FTRACK_METHODS)
+    session.query('select id from Location')
+
+    assert metrics.phases == {'harvest': 3.0, 'submit': 1.0}
+    assert metrics.timings == {'path_evaluation': 1.0}
+    assert metrics.calls == {'ftrack.query': 2}
+    assert not 'query' in session.__dict__
+
+
+def registry_with_run(path):
+    metrics = action.RunMetrics()
+    metrics.phases['harvest'] = 1.5
+    metrics.calls['ftrack.query'] = 3
+    metrics.call_seconds['ftrack.query'] = 0.25
+    registry = action.MetricsRegistry(path)
+    registry.add(metrics, 'done')
+    registry.add(metrics, 'failed')
+    return registry
+
+
+def test_registry_writes_prometheus_exposition(tmp_path):
+    path = str(tmp_path / 'metrics' / 'accsyn_send.prom')
+    registry_with_run(path)
+
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()
+    assert '# TYPE accsyn_send_runs_total counter' in lines
+    assert 'accsyn_send_runs_total{status="done"} 1' in lines
+    assert 'accsyn_send_runs_total{status="failed"} 1' in lines
+    assert 'accsyn_send_phase_seconds_total{phase="harvest"} 3.0' in lines
+    assert 'accsyn_send_calls_total{api="ftrack",method="query"} 6' in lines
+    assert os.listdir(os.path.dirname(path)) == ['accsyn_send.prom']
+
+
+def test_registry_writes_json(tmp_path):
+    path = str(tmp_path / 'metrics.json')
+    registry_with_run(path)
+
+    with open(path, 'r') as f:
+        assert json.load(f)['runs'] == {'done': 1, 'failed': 1}
+
+
+def test_concurrent_atomic_writes_leave_one_whole_file(tmp_path):
+    path = str(tmp_path / 'new' / 'data.json')
+
+    def write(idx):
+        for _ in range(20):
+            action.write_atomic(path, json.dumps([idx] * 1000))
+
+    threads = [threading.Thread(target=write, args=(idx,)) for idx in
+        range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path, 'r') as f:
+        assert len(set(json.load(f))) == 1
+    assert os.listdir(os.path.dirname(path)) == ['data.json']
+
+
+def test_instrumented_send_records_metrics(tmp_path):
+    show = benchmark.SyntheticShow(components=8)
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    send_action.instrument_sends = True
+    send_action.metrics_path = str(tmp_path / 'accsyn_send.prom')
+
+    assert send_action.run(*show.selection('show')) == 8
+
+    registry = send_action.get_metrics_registry()
+    assert registry.runs == {'done': 1}
+    assert {'starting', 'closing'} <= set(registry.phase_seconds)
+    assert 0 < registry.calls['ftrack.query']
+    assert 0 < registry.calls['accsyn.create']
+    assert os.path.exists(send_action.metrics_path)
@@ -0,0 +1,301 @@
+import re
+import threading
+import time
+
+import pytest
+
+import benchmark
+
+import action
+
+
+class FakeAccsynSession(object):
+    '''Accsyn session serving jobs from scripted *states*, job id => list
+    of job data dicts, advancing one state each time a job is fetched.'''
+
+    def __init__(self, states, fail_batched=0):
+        self.states = dict((job_id, list(job_states)) for (job_id,
+            job_states) in states.items())
+        self.fail_batched = fail_batched
+        self.queries = []
+
+    def _next(self, job_id):
+        job_states = self.states[job_id]
+        job_data = dict(job_states.pop(0) if 1 < len(job_states)
+            else job_states[0])
+        job_data['id'] = job_id
+        return job_data
+
+    def find(self, query):
+        self.queries.append(query)
+        if 0 < self.fail_batched:
+            self.fail_batched -= 1
+            raise IOError('Batched query failed')
+        ids = re.search(r'id in \(([^)]*)\)', query).group(1).split(',')
+        return [self._next(job_id) for job_id in ids if job_id in self.states]
+
+    def find_one(self, query):
+        self.queries.append(query)
+        job_id = query.split('=', 1)[1]
+        return self._next(job_id) if job_id in self.states else None
+
+
+class PushSource(action.AccsynJobSource):
+    '''Push source delivering updates of *job_id* at *times*.'''
+
+    def __init__(self, clock, job_id, times):
+        self.clock = clock
+        self.job_id = job_id
+        self.times = list(times)
+        self.fetched = []
+
+    def wait(self, timeout):
+        if self.times and self.times[0] <= self.clock() + timeout:
+            self.clock.now = max(self.clock(), self.times.pop(0))
+            return [self.job_id]
+        self.clock.sleep(timeout)
+        return None
+
+    def fetch(self, job_ids):
+        self.fetched.append((self.clock(), list(job_ids)))
+        return dict((job_id, {'id': job_id, 'status': 'done',
+            'progress': 100}) for job_id in job_ids)
+
+
+def running(progress, etr=''):
+    return {'status': 'running', 'progress': progress, 'speed': 10.0,
+        'etr': etr}
+
+
+DONE = {'status': 'done', 'progress': 100, 'speed': 0.0, 'etr': ''}
+
+
+def test_parse_and_format_etr():
+    assert action.parse_etr('01:02:03') == 3723
+    assert action.parse_etr('1:00:00:10') == 86410
+    assert action.parse_etr(42) == 42
+    assert action.parse_etr('') is None
+    assert action.parse_etr('soon') is None
+    assert action.format_etr(3723) == '01:02:03'
+    assert action.format_etr(86410) == '1:00:00:10'
+    assert action.format_etr(None) == ''
+
+
+def test_tracker_backs_off_while_status_unchanged():
+    tracker = action.JobProgressTracker('job', min_interval=2.0,
+        max_interval=10.0, backoff=2.0)
+    tracker.update(running(0), 0)
+    assert tracker.interval == 2.0
+    tracker.update(running(0), 2)
+    assert tracker.interval == 4.0
+    tracker.update(running(0), 6)
+    tracker.update(running(0), 14)
+    assert tracker.interval == 10.0
+    tracker.update(DONE, 24)
+    assert tracker.interval == 2.0
+    assert tracker.finished
+
+
+def test_tracker_scales_interval_to_etr():
+    tracker = action.JobProgressTracker('job', min_interval=2.0,
+        max_interval=60.0)
+    tracker.update(running(10, '00:10:00'), 0)
+    tracker.update(running(20, '00:02:00'), 2)
+    assert tracker.interval == 12.0
+    tracker.update(running(30, '00:00:05'), 14)
+    assert tracker.interval == 2.0
+
+
+def test_tracker_reports_changes_and_heartbeat():
+    tracker = action.JobProgressTracker('job', report_interval=60.0)
+    assert tracker.update(running(10), 0)
+    assert not tracker.update(running(10), 5)
+    assert tracker.update(running(11), 10)
+    assert not tracker.update(running(11), 69)
+    assert tracker.update(running(11), 70)
+    assert tracker.update(DONE, 71)
+
+
+def test_monitor_polls_until_all_jobs_finished(clock):
+    session = FakeAccsynSession({
+        'a': [running(0), running(50), DONE],
+        'b': [running(0), DONE],
+    })
+    source = action.PollingJobSource(session, sleep=clock.sleep,
+        clock=clock)
+    monitor = action.AccsynJobMonitor(source, min_interval=2.0,
+        max_interval=60.0, clock=clock)
+    reported = []
+
+    result = monitor.watch(['a', 'b'], reported.append)
+
+    assert sorted(result) == ['a', 'b']
+    assert all(job_data['status'] == 'done' for job_data in
+        result.values())
+    assert [job_data['id'] for job_data in reported].count('a') == 3
+    # Both jobs due at once are fetched with one batched query
+    assert session.queries[0].startswith('Job WHERE id in (')
+    assert 0 < clock()
+
+
+def test_monitor_raises_on_unknown_job(clock):
+    source = action.PollingJobSource(FakeAccsynSession({}),
+        sleep=clock.sleep, clock=clock)
+    monitor = action.AccsynJobMonitor(source, clock=clock)
+    with pytest.raises(Exception):
+        monitor.watch(['missing'], lambda job_data: None)
+
+
+def test_monitor_fetches_pushed_updates_right_away(clock):
+    source = PushSource(clock, 'a', [1.0])
+    monitor = action.AccsynJobMonitor(source, min_interval=2.0,
+        max_interval=60.0, clock=clock)
+
+    result = monitor.watch(['a'], lambda job_data: None)
+
+    assert result['a']['status'] == 'done'
+    assert source.fetched == [(1.0, ['a'])]
+
+
+def test_polling_source_falls_back_and_retries_batched_query(clock):
+    session = FakeAccsynSession({'a': [running(0)], 'b': [running(0)]},
+        fail_batched=1)
+    source = action.PollingJobSource(session, retry_interval=30.0,
+        clock=clock)
+
+    assert sorted(source.fetch(['a', 'b'])) == ['a', 'b']
+    assert not source.batched
+    source.fetch(['a', 'b'])
+    assert [query.startswith('Job WHERE id=') for query in
+        session.queries] == [False, True, True, True, True]
+
+    clock.sleep(30)
+    assert source.batched
+    del session.queries[:]
+    source.fetch(['a', 'b'])
+    assert len(session.queries) == 1
+    assert source.failures == 0
+
+
+def test_polling_source_backs_off_on_repeated_failures(clock):
+    session = FakeAccsynSession({'a': [running(0)], 'b': [running(0)]},
+        fail_batched=2)
+    source = action.PollingJobSource(session, retry_interval=10.0,
+        max_retry_interval=15.0, clock=clock)
+    source.fetch(['a', 'b'])
+    clock.sleep(10)
+    source.fetch(['a', 'b'])
+    clock.sleep(10)
+    assert not source.batched
+    clock.sleep(5)
+    assert source.batched
+
+
+def test_polling_source_chunks_batched_queries():
+    session = FakeAccsynSession(dict((str(idx), [running(0)]) for idx in
+        range(5)))
+    source = action.PollingJobSource(session, batch_size=2)
+    assert len(source.fetch([str(idx) for idx in range(5)])) == 5
+    assert len(session.queries) == 3
+
+
+class FakeSend(object):
+    '''Send run as seen by the scheduler, recording calls.'''
+
+    def __init__(self):
+        self.reported = []
+        self.errors = []
+        self.finished = None
+        self.closed = threading.Event()
+
+    def report_progress(self, job_data, blocking=True):
+        self.reported.append(job_data)
+
+    def error(self, s, blocking=True):
+        self.errors.append(s)
+
+    def crashed(self, e):
+        self.errors.append(str(e))
+
+    def finish(self, jobs_data):
+        self.finished = jobs_data
+
+    def close(self):
+        self.closed.set()
+
+
+def test_scheduler_monitors_jobs_of_several_sends():
+    session = FakeAccsynSession({
+        'a': [running(0), DONE],
+        'b': [running(0), running(50), DONE],
+        'c': [DONE],
+    })
+    scheduler = action.SendScheduler(
+        lambda: action.PollingJobSource(session),
+        min_interval=0.01, max_interval=0.05)
+    (first, second) = (FakeSend(), FakeSend())
+
+    scheduler.watch(first, ['a', 'b'])
+    scheduler.watch(second, ['c'])
+
+    assert first.closed.wait(10)
+    assert second.closed.wait(10)
+    assert sorted(first.finished) == ['a', 'b']
+    assert list(second.finished) == ['c']
+    assert scheduler.metrics()['completed'] == 2
+    assert scheduler.metrics()['in_flight'] == 0
+    assert not first.errors
+
+
+def test_scheduler_recreates_failing_source():
+    sources = []
+
+    class FailingOnce(action.PollingJobSource):
+        def fetch(self, job_ids):
+            if len(sources) == 1:
+                raise IOError('Accsyn unreachable')
+            return action.PollingJobSource.fetch(self, job_ids)
+
+    def create_source():
+        sources.append(FailingOnce(FakeAccsynSession({'a': [DONE]})))
+        return sources[-1]
+
+    scheduler = action.SendScheduler(create_source, min_interval=0.01,
+        max_interval=0.02)
+    send = FakeSend()
+    scheduler.watch(send, ['a'])
+
+    assert send.closed.wait(10)
+    assert len(sources) == 2
+    assert send.finished['a']['status'] == 'done'
+
+
+def wait_until(condition, timeout=10.0):
+    started = time.time()
+    while not condition():
+        assert time.time() - started < timeout
+        time.sleep(0.01)
+
+
+def test_scheduler_monitors_while_ftrack_pool_is_exhausted(tmp_path):
+    show = benchmark.SyntheticShow(components=4, polls_to_finish=20)
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    send_action.ftrack_session_pool_size = 1
+    send_action.job_update_interval = 0.05
+    send_run = action.AccsynSendRun(send_action, *show.selection('show'))
+    send_run.start()
+    job_id = show.create_accsyn_job({'code': 'Transfer', 'tasks': []})['id']
+    send_run.accsyn_jobs[job_id] = {'tasks': 1, 'records': (0, 0),
+        'destination': show.locations[show.DESTINATION_LOCATION]['id']}
+    send_run.destination_locations = []
+    # A preparing send holds the only ftrack session
+    pool = send_action.get_ftrack_session_pool()
+    session = pool.checkout()
+
+    send_action.get_scheduler().watch(send_run, [job_id])
+
+    wait_until(lambda: show.accsyn_jobs[job_id]['status'] == 'done')
+    assert show.jobs[send_run.job_id]['status'] == 'running'
+    pool.checkin(session)
+    wait_until(lambda: show.jobs[send_run.job_id]['status'] == 'done')
+    assert '"progress": 100' in show.jobs[send_run.job_id]['data']
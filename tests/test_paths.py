@@ -0,0 +1,206 @@
+import logging
+import threading
+
+import benchmark
+
+import action
+
+
+def lister(tree):
+    '''Return list_directory callable listing raw directories in *tree*,
+    raw directory => (files, directories).'''
+    return lambda raw_path: tree.get(raw_path)
+
+
+def test_coalesce_deduplicates_without_listing():
+    paths = [('p/a.exr', '/mnt/p/a.exr'), ('p/b.exr', '/mnt/p/b.exr'),
+        ('p/a.exr', '/mnt/p/a.exr')]
+    assert action.coalesce_paths(paths) == [('p/a.exr', [0, 2]),
+        ('p/b.exr', [1])]
+
+
+def test_coalesce_fully_selected_directory():
+    paths = [('p/seq/{}.exr'.format(idx), '/mnt/p/seq/{}.exr'.format(idx))
+        for idx in range(3)]
+    tree = {
+        '/mnt/p': (['other.txt'], ['seq']),
+        '/mnt/p/seq': (['0.exr', '1.exr', '2.exr'], []),
+    }
+    assert action.coalesce_paths(paths, lister(tree)) == [
+        ('p/seq', [0, 1, 2])]
+
+
+def test_coalesce_keeps_files_of_partially_selected_directory():
+    paths = [('p/seq/0.exr', '/mnt/p/seq/0.exr'),
+        ('p/seq/1.exr', '/mnt/p/seq/1.exr')]
+    tree = {'/mnt/p/seq': (['0.exr', '1.exr', '2.exr'], [])}
+    assert action.coalesce_paths(paths, lister(tree)) == [
+        ('p/seq/0.exr', [0]), ('p/seq/1.exr', [1])]
+    # Unless coverage allows it
+    assert action.coalesce_paths(paths, lister(tree), coverage=0.5) == [
+        ('p/seq', [0, 1])]
+
+
+def test_coalesce_respects_unselected_subdirectory_and_min_files():
+    paths = [('p/seq/0.exr', '/mnt/p/seq/0.exr'),
+        ('p/seq/1.exr', '/mnt/p/seq/1.exr')]
+    tree = {'/mnt/p/seq': (['0.exr', '1.exr'], ['proxy'])}
+    assert len(action.coalesce_paths(paths, lister(tree))) == 2
+    tree = {'/mnt/p/seq': (['0.exr', '1.exr'], [])}
+    assert len(action.coalesce_paths(paths, lister(tree), min_files=3)) == 2
+    # Unlistable directories are never coalesced
+    assert len(action.coalesce_paths(paths, lister({}))) == 2
+
+
+def test_path_mapper_falls_back_on_project_name():
+    mapper = action.PathMapper(['proj'])
+    assert mapper.map_path('/mnt/projects/proj/shots/a.exr') == \
+        'proj/shots/a.exr'
+    assert mapper.map_path('P:\\PROJ\\a.exr') == 'PROJ\\a.exr'
+    assert mapper.map_path('proj/a.exr') == 'proj/a.exr'
+    # Project name must make up a whole path element
+    assert mapper.map_path('/mnt/proj_old/a.exr') is None
+    assert mapper.map_path('/mnt/elsewhere/a.exr') is None
+
+
+def test_path_mapper_matches_first_of_several_projects():
+    mapper = action.PathMapper(['proj', 'proj_b', 'B'])
+    assert mapper.map_path('/mnt/proj_b/b/a.exr') == 'proj_b/b/a.exr'
+    assert mapper.map_path('/mnt/b/proj/a.exr') == 'b/proj/a.exr'
+    assert mapper.map_path('/mnt/proj_c/a.exr') is None
+
+
+def test_path_mapper_prefix_rules():
+    mapper = action.PathMapper(['proj'], [
+        {'prefix': '/mnt/projects'},
+        {'prefix': '/mnt/projects/archive', 'share': 'archive'},
+        {'prefix': 'P:\\', 'location': 'studio.windows'},
+        {'project': 'proj', 'share': 'proj_share'},
+    ])
+    assert mapper.map_path('/mnt/projects/archive/x/a.exr') == \
+        'share=archive/x/a.exr'
+    assert mapper.map_path('/mnt/projects/proj/a.exr') == \
+        'share=proj_share/proj/a.exr'
+    assert mapper.map_path('/mnt/projects/other/a.exr') == 'other/a.exr'
+    assert mapper.map_path('P:\\other\\a.exr', 'studio.windows') == \
+        'other\\a.exr'
+    # Location restricted rule does not apply to other locations
+    assert mapper.map_path('P:\\other\\a.exr', 'studio.linux') is None
+    # Project share applies to the fallback as well
+    assert mapper.map_path('/home/PROJ/a.exr') == 'share=proj_share/PROJ/a.exr'
+
+
+def test_path_mapper_counts_and_learns_projects():
+    mapper = action.PathMapper(['proj'])
+    result = mapper.map_paths([('/mnt/proj/a.exr', None),
+        ('/mnt/new/a.exr', None)])
+    assert result == ['proj/a.exr', None]
+    assert (mapper.mapped, mapper.rejected) == (1, 1)
+    mapper.add_projects(['new'])
+    assert mapper.map_path('/mnt/new/a.exr') == 'new/a.exr'
+    assert mapper.map_path('/mnt/proj/a.exr') == 'proj/a.exr'
+    # Single paths are not counted
+    assert (mapper.mapped, mapper.rejected) == (1, 1)
+
+
+class ThreadRecordingAccessor(benchmark.FakeDiskAccessor):
+    '''Custom accessor, recording names of threads calling it.'''
+
+    def __init__(self, prefix):
+        benchmark.FakeDiskAccessor.__init__(self, prefix)
+        self.threads = []
+
+    def get_filesystem_path(self, resource_identifier):
+        self.threads.append(threading.current_thread().name)
+        return benchmark.FakeDiskAccessor.get_filesystem_path(self,
+            resource_identifier)
+
+
+class ThreadRecordingLocation(benchmark.FakeLocation):
+    '''Location recording names of threads resolving paths through it.'''
+
+    def __init__(self, location_id, name, prefix,
+            resource_identifier_transformer=None):
+        benchmark.FakeLocation.__init__(self, location_id, name, prefix)
+        self.accessor = ThreadRecordingAccessor(prefix)
+        self.resource_identifier_transformer = \
+            resource_identifier_transformer
+        self.threads = []
+
+    def get_filesystem_path(self, component):
+        self.threads.append(threading.current_thread().name)
+        return benchmark.FakeLocation.get_filesystem_path(self, component)
+
+
+def component_at(name, *locations_and_identifiers):
+    component = {'id': name, 'name': name, 'component_locations': []}
+    for (location, resource_identifier) in locations_and_identifiers:
+        component['component_locations'].append({'location': location,
+            'resource_identifier': resource_identifier})
+    return component
+
+
+def create_resolver(**kwargs):
+    return action.PathResolver(logging.getLogger(__name__),
+        excluded=['ftrack.server'],
+        direct_accessors=[benchmark.FakeDiskAccessor], **kwargs)
+
+
+def test_resolver_joins_direct_paths_without_calling_accessor():
+    location = benchmark.FakeLocation('l1', 'studio.disk', '/mnt/studio')
+    location.accessor.get_filesystem_path = None
+    resolver = create_resolver()
+
+    assert resolver.resolve([component_at('a', (location, 'p/a.exr')),
+        component_at('b', (location, '../../etc/passwd'))]) == [
+        ('/mnt/studio/p/a.exr', 'studio.disk', 'l1'), (None, None, None)]
+    assert resolver.stats['studio.disk'] == {'resolved': 1, 'failed': 1}
+
+
+def test_resolver_takes_first_location_resolving_a_path():
+    excluded = benchmark.FakeLocation('l0', 'ftrack.server', '/server')
+    empty = benchmark.FakeLocation('l1', 'studio.disk', '/mnt/studio')
+    other = benchmark.FakeLocation('l2', 'archive.disk', '/mnt/archive')
+    resolver = create_resolver()
+
+    assert resolver.resolve([component_at('a', (excluded, 'p/a.exr'),
+        (empty, ''), (other, 'p/a.exr'))]) == [
+        ('/mnt/archive/p/a.exr', 'archive.disk', 'l2')]
+
+
+def test_resolver_calls_custom_accessors_on_pool():
+    location = ThreadRecordingLocation('l1', 'studio.cloud', '/cloud')
+    resolver = create_resolver(max_workers=4)
+    try:
+        result = resolver.resolve([component_at(str(idx), (location,
+            'p/{}.exr'.format(idx))) for idx in range(8)])
+    finally:
+        resolver.close()
+
+    assert result == [('/cloud/p/{}.exr'.format(idx), 'studio.cloud', 'l1')
+        for idx in range(8)]
+    assert not threading.current_thread().name in location.accessor.threads
+    assert not location.threads
+
+
+def test_resolver_falls_back_on_location_serially():
+    main = threading.current_thread().name
+    transforming = ThreadRecordingLocation('l1', 'studio.transformed',
+        '/transformed', resource_identifier_transformer=object())
+    cloud = ThreadRecordingLocation('l2', 'studio.cloud', '/cloud')
+    resolver = create_resolver(max_workers=4)
+    try:
+        result = resolver.resolve([
+            # Identifiers are transformed by location, not accessor
+            component_at('a', (transforming, 'p/a.exr')),
+            # No identifier prefetched, resolved by location
+            component_at('b', (cloud, '')),
+        ])
+    finally:
+        resolver.close()
+
+    assert result == [('/transformed/p/a.exr', 'studio.transformed', 'l1'),
+        ('/cloud/', 'studio.cloud', 'l2')]
+    assert transforming.threads == [main]
+    assert cloud.threads == [main]
+    assert resolver.stats['studio.cloud']['fallback'] == 1
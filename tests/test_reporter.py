@@ -0,0 +1,134 @@
+import action
+
+
+class FakeTimer(object):
+    '''Timer fired by hand through fire(), instances kept in *timers*.'''
+
+    timers = []
+
+    def __init__(self, delay, callback):
+        self.delay = delay
+        self.callback = callback
+        self.started = self.cancelled = False
+        FakeTimer.timers.append(self)
+
+    def start(self):
+        self.started = True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fire(self):
+        self.callback()
+
+
+class FakeJob(object):
+    '''ftrack job written by the reporter, busy while *busy* is set.'''
+
+    def __init__(self):
+        self.writes = []
+        self.busy = False
+
+    def __call__(self, data, blocking):
+        if self.busy and not blocking:
+            return False
+        self.writes.append(dict(data))
+
+
+def create_reporter(clock, job):
+    FakeTimer.timers = []
+    return action.ProgressReporter(job, interval=5.0, clock=clock,
+        timer_class=FakeTimer)
+
+
+def test_reports_are_throttled(clock):
+    job = FakeJob()
+    reporter = create_reporter(clock, job)
+    reporter.report('Harvesting')
+    reporter.report('Page 1')
+    reporter.report('Page 2')
+    assert [data['description'] for data in job.writes] == ['Harvesting']
+    assert reporter.suppressed == 1
+
+    clock.sleep(5)
+    reporter.report('Page 3')
+    assert job.writes[-1]['description'] == 'Page 3'
+    reporter.report('Submitting', force=True)
+    assert job.writes[-1]['description'] == 'Submitting'
+    assert reporter.flush_count == 3
+
+
+def test_fields_are_written_with_message(clock):
+    job = FakeJob()
+    reporter = create_reporter(clock, job)
+    reporter.update(phase='harvest', files=10)
+    reporter.report('Harvesting')
+    assert job.writes == [{'description': 'Harvesting', 'phase': 'harvest',
+        'files': 10}]
+    # Nothing changed, nothing written
+    reporter.update(files=10)
+    reporter.flush()
+    assert len(job.writes) == 1
+
+
+def test_timer_flushes_buffered_report(clock):
+    job = FakeJob()
+    reporter = create_reporter(clock, job)
+    reporter.report('Harvesting')
+    clock.sleep(1)
+    reporter.report('Page 1')
+    assert len(FakeTimer.timers) == 1
+    assert FakeTimer.timers[0].delay == 4.0
+    assert FakeTimer.timers[0].started
+
+    clock.sleep(4)
+    FakeTimer.timers[0].fire()
+    assert job.writes[-1]['description'] == 'Page 1'
+
+
+def test_timer_retries_while_job_busy(clock):
+    job = FakeJob()
+    reporter = create_reporter(clock, job)
+    reporter.report('Harvesting')
+    reporter.report('Page 1')
+    job.busy = True
+    FakeTimer.timers[0].fire()
+    assert len(job.writes) == 1
+    assert len(FakeTimer.timers) == 2
+    assert FakeTimer.timers[1].delay == 5.0
+
+    job.busy = False
+    FakeTimer.timers[1].fire()
+    assert job.writes[-1]['description'] == 'Page 1'
+    assert len(FakeTimer.timers) == 2
+
+
+def test_close_cancels_timer(clock):
+    job = FakeJob()
+    reporter = create_reporter(clock, job)
+    reporter.report('Harvesting')
+    reporter.report('Page 1')
+    reporter.close()
+    assert FakeTimer.timers[0].cancelled
+    reporter.report('Page 2')
+    assert len(FakeTimer.timers) == 1
+    # Pending data is left for a final flush
+    reporter.flush()
+    assert job.writes[-1]['description'] == 'Page 2'
+
+
+def test_non_blocking_report_is_left_to_timer(clock):
+    job = FakeJob()
+    reporter = create_reporter(clock, job)
+    reporter.report('Harvesting')
+    clock.sleep(5)
+    job.busy = True
+    # Due, but the job cannot be written right away
+    reporter.report('Job running', blocking=False)
+    assert len(job.writes) == 1
+    assert FakeTimer.timers[0].delay == 0
+
+    job.busy = False
+    FakeTimer.timers[0].fire()
+    assert job.writes[-1]['description'] == 'Job running'
+    assert reporter.suppressed == 0
@@ -0,0 +1,95 @@
+import benchmark
+
+import action
+
+
+def test_pool_reuses_most_recently_used_session():
+    created = []
+    pool = action.SessionPool(lambda: created.append(object()) or
+        created[-1], max_size=2)
+    (first, second) = (pool.checkout(), pool.checkout())
+    assert pool.checkout(blocking=False) is None
+    pool.checkin(first)
+    pool.checkin(second)
+    assert pool.checkout() is second
+    assert pool.metrics() == {'size': 2, 'idle': 1, 'created': 2,
+        'evicted': 0}
+
+
+def test_pool_evicts_dead_and_discards_unresettable_sessions():
+    closed = []
+    broken = []
+
+    def health_check(session):
+        if session == 'dead':
+            raise Exception('Session expired')
+
+    def reset(session):
+        if session in broken:
+            raise Exception('Cannot reset')
+
+    sessions = iter(['dead', 'alive', 'fresh'])
+    pool = action.SessionPool(lambda: next(sessions), max_size=1,
+        reset=reset, health_check=health_check, check_interval=0,
+        close=closed.append)
+    pool.checkin(pool.checkout())
+    assert pool.checkout() == 'alive'
+    assert closed == ['dead']
+    assert pool.metrics()['evicted'] == 1
+
+    broken.append('alive')
+    pool.checkin('alive')
+    assert closed == ['dead', 'alive']
+    assert pool.metrics()['size'] == 0
+    assert pool.checkout() == 'fresh'
+
+
+def test_stages_check_out_only_pools_used(tmp_path):
+    show = benchmark.SyntheticShow(components=4)
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    send_run = action.AccsynSendRun(send_action, *show.selection('show'))
+    ftrack_pool = send_action.get_ftrack_session_pool()
+    accsyn_pool = send_action.get_accsyn_session_pool()
+
+    with send_run.sessions():
+        assert send_run.session is not None
+        assert send_run.accsyn_session is None
+        with send_run.sessions(accsyn=True):
+            session = send_run.session
+            assert send_run.accsyn_session is not None
+        assert send_run.session is session
+        assert send_run.accsyn_session is None
+    assert send_run.session is None
+
+    assert ftrack_pool.metrics()['created'] == 1
+    assert ftrack_pool.metrics()['idle'] == 1
+    assert accsyn_pool.metrics()['created'] == 1
+    assert accsyn_pool.metrics()['idle'] == 1
+
+
+def test_location_cache_refetches_after_ttl_or_invalidation(clock):
+    show = benchmark.SyntheticShow(components=4, locations=1)
+    session = benchmark.FakeFtrackSession(show)
+    cache = action.LocationCache(excluded=show.EXCLUDED_LOCATIONS, ttl=60.0,
+        clock=clock)
+    destination = show.locations[show.DESTINATION_LOCATION]
+
+    assert cache.get(session, show.DESTINATION_LOCATION) == {
+        'id': destination['id'], 'name': show.DESTINATION_LOCATION}
+    assert cache.get(session, 'missing') is None
+    assert cache.enumerator(session) == [{'label': name, 'value': name}
+        for name in (show.SOURCE_LOCATION, show.DESTINATION_LOCATION)]
+    assert show.counters['ftrack.query'] == 1
+
+    clock.sleep(60)
+    cache.get(session, show.DESTINATION_LOCATION)
+    assert show.counters['ftrack.query'] == 2
+
+    cache.handle_update_event({'data': {'entities': [
+        {'entityType': 'task', 'entityId': 't1'}]}})
+    cache.get(session, show.DESTINATION_LOCATION)
+    assert show.counters['ftrack.query'] == 2
+    cache.handle_update_event({'data': {'entities': [
+        {'entityType': 'Location', 'entityId': destination['id']}]}})
+    cache.get(session, show.DESTINATION_LOCATION)
+    assert show.counters['ftrack.query'] == 3
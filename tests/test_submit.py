@@ -0,0 +1,169 @@
+import json
+import os
+
+import benchmark
+
+import action
+
+
+def running(progress, etr=''):
+    return {'status': 'running', 'progress': progress, 'speed': 10.0,
+        'etr': etr}
+
+
+DONE = {'status': 'done', 'progress': 100, 'speed': 0.0, 'etr': ''}
+
+
+def test_split_tasks_by_count_and_size():
+    tasks = [{'source': 'x' * 10} for idx in range(5)]
+    assert action.split_tasks(tasks, 2, 10 ** 6) == [(0, 2), (2, 4), (4, 5)]
+    task_size = len(json.dumps(tasks[0])) + 2
+    assert action.split_tasks(tasks, 100, task_size * 3) == [(0, 3), (3, 5)]
+    # A single oversized task still makes up a part of its own
+    assert action.split_tasks(tasks, 100, 1) == [(idx, idx + 1) for idx in
+        range(5)]
+    assert action.split_tasks([], 2, 100) == []
+
+
+def test_aggregate_job_data():
+    aggregate = action.aggregate_job_data([
+        (dict(running(50, '00:01:00')), 1),
+        (dict(DONE), 3),
+    ])
+    assert aggregate['status'] == 'running'
+    assert aggregate['progress'] == 87
+    assert aggregate['speed'] == 10.0
+    assert aggregate['etr'] == 60
+    aggregate = action.aggregate_job_data([
+        (dict(DONE), 1),
+        ({'status': 'failed', 'progress': 10}, 1),
+    ])
+    assert aggregate['status'] == 'failed'
+
+
+def test_large_send_is_split_into_parallel_jobs(tmp_path):
+    show = benchmark.SyntheticShow(components=35)
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    send_action.max_tasks_per_job = 10
+    send_action.submit_workers = 2
+
+    assert send_action.run(*show.selection('show')) == 35
+
+    assert sorted(job['tasks'] for job in show.accsyn_jobs.values()) == \
+        [5, 10, 10, 10]
+    destination_id = show.locations[show.DESTINATION_LOCATION]['id']
+    assert all(show.component_locations[(destination_id, component['id'])]
+        for component in show.components)
+    assert list(show.jobs.values())[0]['status'] == 'done'
+
+
+class PagedSession(benchmark.FakeFtrackSession):
+    '''Fake ftrack session logging component page queries to *events*,
+    failing the query of page *failing_page* (0 based) if given.'''
+
+    def __init__(self, show, events, failing_page=None):
+        benchmark.FakeFtrackSession.__init__(self, show)
+        self.events = events
+        self.failing_page = failing_page
+
+    def query(self, expression):
+        if ' from Component where' in expression and ' offset ' in \
+                expression:
+            page = int(expression.split(' offset ')[1].split(' ')[0]) // \
+                int(expression.split(' limit ')[1])
+            self.events.append('page {}'.format(page))
+            if page == self.failing_page:
+                raise IOError('ftrack unreachable')
+        return benchmark.FakeFtrackSession.query(self, expression)
+
+
+class SubmitLoggingSession(benchmark.FakeAccsynSession):
+    '''Fake Accsyn session logging job submits to *events*.'''
+
+    def __init__(self, show, events):
+        benchmark.FakeAccsynSession.__init__(self, show)
+        self.events = events
+
+    def create(self, entity_type, data):
+        self.events.append('submit')
+        return benchmark.FakeAccsynSession.create(self, entity_type, data)
+
+
+def create_streaming_action(show, directory, events, failing_page=None):
+    send_action = benchmark.create_send_action(show, directory)
+    send_action.ftrack_session_factory = lambda: PagedSession(show, events,
+        failing_page)
+    send_action.accsyn_session_factory = lambda: SubmitLoggingSession(show,
+        events)
+    send_action.harvest_page_size = 4
+    send_action.max_tasks_per_job = 4
+    send_action.submit_workers = 1
+    return send_action
+
+
+def test_batches_are_submitted_while_harvesting(tmp_path):
+    show = benchmark.SyntheticShow(components=12)
+    events = []
+    send_action = create_streaming_action(show, str(tmp_path), events)
+
+    assert send_action.run(*show.selection('show')) == 12
+
+    # A last, empty, page tells harvest is done
+    assert events.index('submit') < events.index('page 3')
+    assert events.count('submit') == 3
+
+
+def test_jobs_submitted_before_harvest_fails_are_finished(tmp_path):
+    show = benchmark.SyntheticShow(components=12)
+    events = []
+    send_action = create_streaming_action(show, str(tmp_path), events,
+        failing_page=2)
+    destination_id = show.locations[show.DESTINATION_LOCATION]['id']
+
+    assert send_action.run(*show.selection('show')) == 8
+
+    assert len(show.accsyn_jobs) == 2
+    assert all(job['status'] == 'done' for job in show.accsyn_jobs.values())
+    # Components of submitted jobs are registered at destination, the rest
+    # are left for the next launch
+    registered = [component for component in show.components if
+        show.component_locations[(destination_id, component['id'])]]
+    assert len(registered) == 8
+    assert list(show.jobs.values())[0]['status'] == 'failed'
+    assert not os.listdir(send_action.journal_directory)
+
+
+class QueryLoggingSession(benchmark.FakeFtrackSession):
+    '''Fake ftrack session logging queries to *queries*.'''
+
+    def __init__(self, show, queries):
+        benchmark.FakeFtrackSession.__init__(self, show)
+        self.queries = queries
+
+    def query(self, expression):
+        self.queries.append(expression)
+        return benchmark.FakeFtrackSession.query(self, expression)
+
+
+def test_one_harvest_is_sent_to_each_destination(tmp_path):
+    show = benchmark.SyntheticShow(components=12, locations=2)
+    queries = []
+    send_action = benchmark.create_send_action(show, str(tmp_path))
+    send_action.ftrack_session_factory = lambda: QueryLoggingSession(show,
+        queries)
+    (event, entities) = show.selection('show')
+    destinations = [show.DESTINATION_LOCATION, show.OTHER_LOCATIONS[0]]
+    event['data']['values']['destination_location'] = ','.join(destinations)
+
+    assert send_action.run(event, entities) == 12
+
+    assert len([query for query in queries if ' from Component where' in
+        query]) == 1
+    assert len(show.accsyn_jobs) == 2
+    assert sorted(job['tasks'] for job in show.accsyn_jobs.values()) == \
+        [12, 12]
+    for name in destinations:
+        location_id = show.locations[name]['id']
+        assert all(len(show.component_locations[(location_id,
+            component['id'])]) == 1 for component in show.components)
+    assert list(show.jobs.values())[0]['status'] == 'done'